@@ -7,20 +7,77 @@ HTTP客户端和SDK客户端工厂模块
 主要功能:
 - HttpxClient: 创建原始httpx客户端（用于直接HTTP请求）
 - ApiSDKClient: 创建特定提供商的SDK客户端（OpenAI、Google、Anthropic）
+- close_all: 关闭所有缓存的共享客户端
+
+连接复用:
+    聊天机器人使用的同步httpx客户端按创建参数缓存在模块级字典中，
+    相同配置的聊天机器人共享同一个连接池，避免重复的TCP/TLS握手。
+    Google的同步genai.Client按 (api_key, base_url) 缓存。
+    每个共享客户端记录使用者计数，聊天机器人 close() 时计数减一，
+    最后一个使用者关闭时才真正关闭客户端。
+    异步客户端的连接绑定创建时的事件循环，不做缓存，每个聊天机器人独占。
 """
 
+import os
+import warnings
+import functools
+import threading
+import importlib.util
 import httpx
-import openai
-import google
-import anthropic
 from openai import OpenAI, AsyncOpenAI
 from google import genai
 from anthropic import Anthropic, AsyncAnthropic
+from typing import Dict, List, Optional, Tuple
+
+# httpx的HTTP/2支持依赖可选的h2包（pip install httpx[http2]），未安装时回退到HTTP/1.1
+_HAS_H2 = importlib.util.find_spec('h2') is not None
+
+__all__ = ['HttpxClient', 'ApiSDKClient', 'close_all']
 
-__all__ = ['HttpxClient', 'ApiSDKClient']
+# 共享同步httpx客户端缓存，键为 (is_ssl_verify, timeout, http2)，值为 [客户端, 使用者计数]
+_HTTPX_CACHE: Dict[Tuple, List] = {}
+# 共享同步genai.Client缓存，键为 (api_key, base_url)，值为 [客户端, 使用者计数]
+_GENAI_CACHE: Dict[Tuple[str, str], List] = {}
+# 保护上述缓存和使用者计数（同步聊天机器人可能在多个线程中创建和关闭）
+_CACHE_LOCK = threading.Lock()
 
 
-def HttpxClient(is_async: bool, is_ssl_verify: bool = False, timeout: int = 300):
+@functools.lru_cache(maxsize=None)
+def _parse_pool_limit(name: str, raw: str, default: int) -> int:
+    """
+    解析连接池上限环境变量的取值（同一取值只解析、告警一次）
+
+    取值不是正整数时发出警告并使用默认值，避免每次创建客户端都抛出异常。
+    """
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 0
+    if value > 0:
+        return value
+    warnings.warn(
+        f"Environment variable {name}={raw!r} is not a positive integer; "
+        f"using the default {default}.",
+        RuntimeWarning,
+        stacklevel=4
+    )
+    return default
+
+
+def _env_pool_limit(name: str, default: int) -> int:
+    """读取连接池上限环境变量，未设置时返回默认值（调用时读取，.env 中的设置也会生效）"""
+    raw = os.getenv(name)
+    return default if raw is None else _parse_pool_limit(name, raw, default)
+
+
+def HttpxClient(
+    is_async: bool,
+    is_ssl_verify: bool = False,
+    timeout: int = 300,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    http2: bool = True
+):
     """
     创建httpx HTTP客户端
 
@@ -29,9 +86,19 @@ def HttpxClient(is_async: bool, is_ssl_verify: bool = False, timeout: int = 300)
         is_ssl_verify: 是否启用SSL证书验证，默认False
                        在公司代理环境中通常需要设为False
         timeout: 请求超时时间（秒），默认300秒
+        max_connections: 连接池最大连接数，默认取环境变量 HTTPX_MAX_CONNECTIONS，未设置时为1000
+                         （httpx默认100，大量并发请求时容易排队）
+        max_keepalive_connections: 连接池最大保活连接数，默认取环境变量
+                                   HTTPX_MAX_KEEPALIVE_CONNECTIONS，未设置时为100（httpx默认20）
+        http2: 是否启用HTTP/2，默认True
+               并发的流式请求可复用同一TCP+TLS连接，减少握手开销
+               需安装可选依赖h2，未安装时自动回退到HTTP/1.1
 
     返回:
-        httpx.Client 或 httpx.AsyncClient 实例
+        httpx.Client 或 httpx.AsyncClient 实例（每次调用新建，由调用方负责关闭）
+
+    注意:
+        SDK聊天机器人内部创建客户端时不传连接池参数，可通过上述两个环境变量统一调整
 
     示例:
         >>> # 创建同步客户端
@@ -40,8 +107,170 @@ def HttpxClient(is_async: bool, is_ssl_verify: bool = False, timeout: int = 300)
         >>> # 创建异步客户端
         >>> async_client = HttpxClient(is_async=True, is_ssl_verify=True, timeout=60)
     """
+    if max_connections is None:
+        max_connections = _env_pool_limit('HTTPX_MAX_CONNECTIONS', 1000)
+    if max_keepalive_connections is None:
+        max_keepalive_connections = _env_pool_limit('HTTPX_MAX_KEEPALIVE_CONNECTIONS', 100)
     client_func = httpx.AsyncClient if is_async else httpx.Client
-    return client_func(verify=is_ssl_verify, timeout=timeout)
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=30.0
+    )
+    return client_func(verify=is_ssl_verify, timeout=timeout, limits=limits, http2=http2 and _HAS_H2)
+
+
+def _acquire_cached(cache: Dict, key: Tuple, factory) -> List:
+    """
+    从缓存中获取共享客户端并将使用者计数加一
+
+    缓存中没有（或httpx客户端已被外部关闭）时调用 factory() 新建。
+
+    返回:
+        租约 [客户端, 使用者计数]，释放时传给 _release_client()
+    """
+    with _CACHE_LOCK:
+        lease = cache.get(key)
+        if lease is None or getattr(lease[0], 'is_closed', False):
+            lease = cache[key] = [factory(), 0]
+        lease[1] += 1
+        return lease
+
+
+def _release_client(lease: Optional[List]) -> bool:
+    """
+    释放聊天机器人持有的客户端租约
+
+    使用者计数减一，计数归零时将客户端移出缓存。
+
+    参数:
+        lease: _acquire_httpx_client() / _acquire_sdk_client() 返回的租约，
+               None表示已释放过
+
+    返回:
+        True表示已无其他使用者，调用方应关闭客户端；False表示客户端仍被其他聊天机器人使用
+    """
+    if lease is None:
+        return False
+    with _CACHE_LOCK:
+        lease[1] -= 1
+        if lease[1] > 0:
+            return False
+        for cache in (_HTTPX_CACHE, _GENAI_CACHE):
+            for key in [k for k, v in cache.items() if v is lease]:
+                del cache[key]
+        return True
+
+
+def _acquire_httpx_client(is_async: bool, is_ssl_verify: bool, timeout: int = 300, http2: bool = True) -> List:
+    """
+    获取聊天机器人使用的httpx客户端租约
+
+    同步客户端按参数共享；异步客户端的连接绑定事件循环，跨 asyncio.run() 复用会失败，
+    因此每次新建，由持有者独占。
+
+    返回:
+        租约 [客户端, 使用者计数]
+    """
+    if is_async:
+        return [HttpxClient(True, is_ssl_verify, timeout=timeout, http2=http2), 1]
+    key = (is_ssl_verify, timeout, http2)
+    return _acquire_cached(
+        _HTTPX_CACHE, key,
+        lambda: HttpxClient(False, is_ssl_verify, timeout=timeout, http2=http2)
+    )
+
+
+def close_all() -> None:
+    """
+    关闭所有缓存的共享客户端并清空缓存
+
+    适用于程序退出前统一释放连接池资源。异步客户端不做缓存，由各聊天机器人的 aclose() 关闭。
+    """
+    with _CACHE_LOCK:
+        for cache in (_HTTPX_CACHE, _GENAI_CACHE):
+            for lease in cache.values():
+                lease[0].close()
+            cache.clear()
+
+
+def _init_openai_like(client_cls, api_key: str, base_url: str, is_async: bool, is_ssl_verify: bool, shared: bool):
+    """
+    初始化OpenAI/Anthropic SDK客户端
+
+    两者都支持外部传入http_client，可以配置SSL验证和超时等参数；shared为True时同步客户端共享连接池。
+    SDK客户端关闭时会一并关闭传入的http_client，因此共享时只由最后一个使用者关闭。
+    SDK客户端保持HTTP/1.1（与SDK自带客户端一致）；需要HTTP/2时可使用 OpenAIHttpxChatBot(http2=True)。
+    """
+    if shared:
+        http_lease = _acquire_httpx_client(is_async, is_ssl_verify, timeout=300, http2=False)
+        http_client = http_lease[0]
+    else:
+        http_lease, http_client = None, HttpxClient(is_async, is_ssl_verify, timeout=300, http2=False)
+    client = client_cls(api_key=api_key, base_url=base_url, http_client=http_client)
+    return client, http_lease or [client, 1]
+
+
+def _init_google(client_cls, api_key: str, base_url: str, is_async: bool, is_ssl_verify: bool, shared: bool):
+    """
+    初始化Google genai SDK客户端
+
+    genai.Client内部处理同步/异步，且不支持外部传入http_client（见 ApiSDKClient 文档）。
+    shared为True且为同步模式时按 (api_key, base_url) 共享；异步模式的连接绑定事件循环，每次新建。
+    """
+    # Google SDK不支持外部传入http_client，使用http_options配置base_url
+    factory = lambda: client_cls(api_key=api_key, http_options={'base_url': base_url})
+    if shared and not is_async:
+        lease = _acquire_cached(_GENAI_CACHE, (api_key, base_url), factory)
+        return lease[0], lease
+    client = factory()
+    return client, [client, 1]
+
+
+# 接口类型 -> (初始化函数, 同步客户端类, 异步客户端类)
+_DISPATCH = {
+    'openai': (_init_openai_like, OpenAI, AsyncOpenAI),
+    'google': (_init_google, genai.Client, genai.Client),
+    'anthropic': (_init_openai_like, Anthropic, AsyncAnthropic),
+}
+
+
+def _acquire_sdk_client(
+    api_key: str,
+    base_url: str,
+    interfacetype: str,
+    is_async: bool,
+    is_ssl_verify: bool,
+    shared: bool = True
+) -> Tuple[object, List]:
+    """
+    创建SDK客户端并返回其租约，供聊天机器人使用
+
+    参数同 ApiSDKClient；shared为True时同步客户端共享连接池（见模块文档）。
+
+    返回:
+        (SDK客户端, 租约)，租约在关闭时传给 _release_client()
+
+    异常:
+        ValueError: 如果 API key 为空或无效，或 interfacetype 不受支持
+    """
+    # 验证 API key
+    if not api_key or not api_key.strip():
+        raise ValueError(
+            f"API key cannot be empty for interfacetype: {interfacetype}. "
+            f"Please check your .env file or pass api_key explicitly."
+        )
+
+    try:
+        init_func, sync_cls, async_cls = _DISPATCH[interfacetype]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported interfacetype: {interfacetype}. "
+            f"Expected one of: {', '.join(_DISPATCH)}."
+        ) from None
+
+    return init_func(async_cls if is_async else sync_cls, api_key, base_url, is_async, is_ssl_verify, shared)
+
 
 def ApiSDKClient(
     api_key: str,
@@ -71,9 +300,10 @@ def ApiSDKClient(
         - OpenAI: OpenAI 或 AsyncOpenAI
         - Google: genai.Client（内部处理同步/异步）
         - Anthropic: Anthropic 或 AsyncAnthropic
+        每次调用新建，由调用方负责关闭（聊天机器人内部使用共享连接池，见模块文档）
 
     异常:
-        ValueError: 如果 API key 为空或无效
+        ValueError: 如果 API key 为空或无效，或 interfacetype 不受支持
         其他SDK相关的认证或连接异常
 
     示例:
@@ -112,39 +342,5 @@ def ApiSDKClient(
                 has_aiohttp = False
             以强制使用httpx，使Step 2的配置在异步情形也生效
     """
-    # 验证 API key
-    if not api_key or not api_key.strip():
-        raise ValueError(
-            f"API key cannot be empty for interfacetype: {interfacetype}. "
-            f"Please check your .env file or pass api_key explicitly."
-        )
-
-    # 根据接口类型选择对应的客户端类
-    match interfacetype:
-        case 'openai':
-            client_func = AsyncOpenAI if is_async else OpenAI
-        case 'google':
-            client_func = genai.Client  # Google内部处理同步/异步
-        case 'anthropic':
-            client_func = AsyncAnthropic if is_async else Anthropic
-
-    # 根据接口类型使用不同的初始化方式
-    match interfacetype:
-        case 'google':
-            # Google SDK不支持外部传入http_client
-            # 使用http_options配置base_url
-            client = client_func(
-                api_key=api_key,
-                http_options={'base_url': base_url}
-            )
-        case _:
-            # OpenAI和Anthropic支持外部传入http_client
-            # 可以配置SSL验证和超时等参数
-            client = client_func(
-                api_key=api_key,
-                base_url=base_url,
-                http_client=HttpxClient(is_async, is_ssl_verify, timeout=300)
-            )
-
+    client, _ = _acquire_sdk_client(api_key, base_url, interfacetype, is_async, is_ssl_verify, shared=False)
     return client
-
@@ -8,52 +8,59 @@ Httpx到OpenAI格式转换模块
 - ParseTotalResponse: 解析完整JSON响应为ChatCompletion
 - ProcessStreamResponse: 处理同步流式响应
 - AsyncProcessStreamResponse: 处理异步流式响应
-- SSE（Server-Sent Events）流式数据解析
+- SSEParser: 增量式SSE（Server-Sent Events）字节流解析
 
 使用场景:
     当使用httpx直接请求OpenAI兼容API时，需要将原始响应
     转换为OpenAI SDK的类型以保持接口一致性。
 """
 
-import httpx
 import json
-from typing import Optional, Callable, Dict, Any
+from typing import Iterator, Optional, Callable, Union, Dict, Any
 from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
 from openai.types.chat.chat_completion import Choice
 from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice
 from openai.types.chat.chat_completion_chunk import ChoiceDelta
 from openai.types.chat.chat_completion_chunk import ChoiceDeltaFunctionCall, ChoiceDeltaToolCall
-from openai.types.completion_usage import CompletionUsage
+from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCallFunction, ChoiceLogprobs
+from openai.types.completion_usage import CompletionUsage, CompletionTokensDetails, PromptTokensDetails
 
 from . import _OpenAI
+from .common_utils import json_loads
 
-__all__ = ['ParseTotalResponse', 'ProcessStreamResponse', 'AsyncProcessStreamResponse']
+__all__ = ['SSEParser', 'ParseTotalResponse', 'ProcessStreamResponse', 'AsyncProcessStreamResponse']
 
+# SSE字段前缀和流结束标记（按bytes比较，无需逐行解码为str）
+_DATA_PREFIX = b'data:'
+_DATA_PREFIX_LEN = len(_DATA_PREFIX)
+_DONE_TOKEN = b'[DONE]'
 
-def ParseTotalResponse(response: Dict[str, Any]) -> ChatCompletion:
+
+def ParseTotalResponse(response: Dict[str, Any], validate: bool = False) -> ChatCompletion:
     """
     将httpx返回的JSON响应转换为ChatCompletion对象
 
     参数:
         response: 原始JSON响应字典
+        validate: 是否执行pydantic校验，默认False
+                  服务端JSON可信时使用model_construct跳过逐字段校验（choices较多时收益明显）
 
     返回:
         ChatCompletion对象
     """
-    return ChatCompletion(
+    (completion_cls, choice_cls, message_cls, usage_cls) = (
+        (ChatCompletion, Choice, ChatCompletionMessage, CompletionUsage) if validate else
+        (ChatCompletion.model_construct, Choice.model_construct,
+         ChatCompletionMessage.model_construct, CompletionUsage.model_construct))
+    usage = response.get("usage")
+    return completion_cls(
         id=response["id"],
         choices=[
-            Choice(
+            choice_cls(
                 finish_reason=choice["finish_reason"],
                 index=choice["index"],
                 logprobs=choice.get("logprobs"),
-                message=ChatCompletionMessage(**choice['message'])
-                # message=ChatCompletionMessage(
-                #     content=choice["message"]["content"],
-                #     role=choice["message"]["role"],
-                #     function_call=choice["message"].get("function_call"),
-                #     tool_calls=choice["message"].get("tool_calls")
-                # )
+                message=message_cls(**choice['message'])
             )
             for choice in response["choices"]
         ],
@@ -61,14 +68,35 @@ def ParseTotalResponse(response: Dict[str, Any]) -> ChatCompletion:
         model=response["model"],
         object=response["object"],
         system_fingerprint=response.get("system_fingerprint"),
-        usage=CompletionUsage(
-            completion_tokens=response["usage"]["completion_tokens"],
-            prompt_tokens=response["usage"]["prompt_tokens"],
-            total_tokens=response["usage"]["total_tokens"]
-        ) if "usage" in response else None
+        usage=usage_cls(
+            completion_tokens=usage["completion_tokens"],
+            prompt_tokens=usage["prompt_tokens"],
+            total_tokens=usage["total_tokens"]
+        ) if usage else None
     )
 
-def _parse_chunk_data(chunk_response: str) -> ChatCompletionChunk:
+# 跳过校验的构造函数（模块级绑定，避免热路径中每个chunk重复查找全局名和属性）
+_CDFC = ChoiceDeltaFunctionCall.model_construct
+_CDTC = ChoiceDeltaToolCall.model_construct
+_CDTCF = ChoiceDeltaToolCallFunction.model_construct
+_CD = ChoiceDelta.model_construct
+_CC = ChunkChoice.model_construct
+_CL = ChoiceLogprobs.model_construct
+_CU = CompletionUsage.model_construct
+_CTD = CompletionTokensDetails.model_construct
+_PTD = PromptTokensDetails.model_construct
+_CCC = ChatCompletionChunk.model_construct
+
+# _parse_chunk_data 使用的构造函数组，按 validate 选择
+_VALIDATED_CONSTRUCTORS = (
+    ChoiceDeltaFunctionCall, ChoiceDeltaToolCall, ChoiceDeltaToolCallFunction, ChoiceDelta,
+    ChunkChoice, ChoiceLogprobs, CompletionUsage, CompletionTokensDetails, PromptTokensDetails,
+    ChatCompletionChunk
+)
+_UNVALIDATED_CONSTRUCTORS = (_CDFC, _CDTC, _CDTCF, _CD, _CC, _CL, _CU, _CTD, _PTD, _CCC)
+
+
+def _parse_chunk_data(chunk_response: Union[str, bytes], validate: bool = False) -> ChatCompletionChunk:
     """
     解析单个SSE chunk数据并转换为ChatCompletionChunk对象
 
@@ -76,69 +104,82 @@ def _parse_chunk_data(chunk_response: str) -> ChatCompletionChunk:
     tool_calls、reasoning_content等字段。
 
     参数:
-        chunk_response: SSE数据块的JSON字符串
+        chunk_response: SSE数据块的JSON字符串或字节（bytes可直接交给JSON解析器，省去一次解码）
+        validate: 是否对每个chunk执行pydantic校验，默认False
+                  上游JSON可信时跳过校验（model_construct），可显著降低每个chunk的CPU开销
+                  跳过校验时嵌套字典不会被自动转换，因此嵌套对象也显式构造
 
     返回:
         ChatCompletionChunk对象
     """
-    chunk_json = json.loads(chunk_response)
+    (cdfc, cdtc, cdtcf, cd, cc, cl, cu, ctd, ptd, ccc) = (
+        _VALIDATED_CONSTRUCTORS if validate else _UNVALIDATED_CONSTRUCTORS)
+    chunk_json = json_loads(chunk_response)
 
     # 处理choices
     choices = []
-    for choice_data in chunk_json.get("choices", []):
+    for choice_data in chunk_json.get("choices", ()):
         delta_data = choice_data.get("delta", {})
         # 处理function_call
         function_call = None
-        if "function_call" in delta_data:
-            fc_data = delta_data["function_call"]
-            function_call = ChoiceDeltaFunctionCall(
-                arguments=fc_data.get("arguments"),
-                name=fc_data.get("name")
-            )
+        fc_data = delta_data.get("function_call")
+        if fc_data is not None:
+            function_call = cdfc(arguments=fc_data.get("arguments"), name=fc_data.get("name"))
         # 处理tool_calls
         tool_calls = None
-        if "tool_calls" in delta_data:
+        tc_list = delta_data.get("tool_calls")
+        if tc_list is not None:
             tool_calls = []
-            for tc_data in delta_data["tool_calls"]:
-                tool_call = ChoiceDeltaToolCall(
+            for tc_data in tc_list:
+                function = tc_data.get("function")
+                tool_calls.append(cdtc(
                     index=tc_data.get("index"),
                     id=tc_data.get("id"),
-                    function=tc_data.get("function"),
+                    function=cdtcf(**function) if function else None,
                     type=tc_data.get("type")
-                )
-                tool_calls.append(tool_call)
-        # 创建ChoiceDelta对象
-        delta = dict(
-            content=delta_data.get("content"),
-            function_call=function_call,
-            role=delta_data.get("role"),
-            tool_calls=tool_calls,
-            refusal=delta_data.get("refusal")  # 处理refusal字段
-        )
-        if delta_data.get('reasoning_content'):
-            delta['reasoning_content'] = delta_data['reasoning_content']
-        delta = ChoiceDelta(**delta)
+                ))
+        # 创建ChoiceDelta对象（reasoning_content仅在非空时设置）
+        reasoning_content = delta_data.get('reasoning_content')
+        if reasoning_content:
+            delta = cd(
+                content=delta_data.get("content"),
+                function_call=function_call,
+                role=delta_data.get("role"),
+                tool_calls=tool_calls,
+                refusal=delta_data.get("refusal"),  # 处理refusal字段
+                reasoning_content=reasoning_content
+            )
+        else:
+            delta = cd(
+                content=delta_data.get("content"),
+                function_call=function_call,
+                role=delta_data.get("role"),
+                tool_calls=tool_calls,
+                refusal=delta_data.get("refusal")
+            )
         # 创建ChunkChoice对象
-        choice = ChunkChoice(
+        logprobs = choice_data.get("logprobs")
+        choices.append(cc(
             delta=delta,
             finish_reason=choice_data.get("finish_reason"),
             index=choice_data.get("index", 0),
-            logprobs=choice_data.get("logprobs")
-        )
-        choices.append(choice)
+            logprobs=cl(**logprobs) if logprobs else None
+        ))
     # 处理usage信息
     usage = None
-    usage_data = chunk_json['usage'] if 'usage' in chunk_json else None
+    usage_data = chunk_json.get('usage')
     if usage_data:
-        usage = CompletionUsage(
+        completion_details = usage_data.get("completion_tokens_details")
+        prompt_details = usage_data.get("prompt_tokens_details")
+        usage = cu(
             completion_tokens=usage_data.get("completion_tokens", 0),
             prompt_tokens=usage_data.get("prompt_tokens", 0),
             total_tokens=usage_data.get("total_tokens", 0),
-            completion_tokens_details=usage_data.get("completion_tokens_details"),
-            prompt_tokens_details=usage_data.get("prompt_tokens_details")
+            completion_tokens_details=ctd(**completion_details) if completion_details else None,
+            prompt_tokens_details=ptd(**prompt_details) if prompt_details else None
         )
 
-    return ChatCompletionChunk(
+    return ccc(
         id=chunk_json["id"],
         choices=choices,
         created=chunk_json["created"],
@@ -150,92 +191,208 @@ def _parse_chunk_data(chunk_response: str) -> ChatCompletionChunk:
     )
 
 
-def _process_stream_line(
-    line: str,
+class SSEParser:
+    """
+    增量式SSE（Server-Sent Events）解析器
+
+    直接消费网络字节块，在内部缓冲区中按空行切分事件，
+    正确处理跨网络chunk被截断的事件（逐行解析时这类事件会被当作无效JSON丢弃）。
+
+    属性:
+        _buf: 尚未构成完整事件的剩余字节
+
+    示例:
+        >>> parser = SSEParser()
+        >>> list(parser.feed(b'data: {"a": 1}\n\ndata: {"b"'))
+        [b'{"a": 1}']
+        >>> list(parser.feed(b': 2}\n\n'))
+        [b'{"b": 2}']
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """
+        送入一个网络字节块，返回其中所有完整事件的data内容
+
+        参数:
+            data: 网络字节块（如 response.iter_bytes() 的输出）
+
+        返回:
+            事件data字段（bytes）的迭代器，多行data以换行符拼接
+        """
+        pending_cr = self._buf.endswith(b'\r')
+        buf = self._buf
+        buf += data
+        # 统一换行符；仅在出现 \r 时才整体替换，末尾孤立的 \r 会在下一块到达后再被替换
+        if pending_cr or b'\r' in data:
+            buf = self._buf = buf.replace(b'\r\n', b'\n')
+        start = 0
+        while True:
+            end = buf.find(b'\n\n', start)
+            if end < 0:
+                break
+            if buf.startswith(_DATA_PREFIX, start) and buf.find(b'\n', start, end) < 0:
+                # 常见情况：单行data事件，直接从缓冲区拷贝一次data内容
+                data_start = start + _DATA_PREFIX_LEN
+                if buf.startswith(b' ', data_start):
+                    data_start += 1
+                yield bytes(memoryview(buf)[data_start:end])
+            else:
+                event = _parse_event(buf[start:end])
+                if event is not None:
+                    yield event
+            start = end + 2
+        # 原地删除已消费的字节，剩余数据前移，不重新分配缓冲区
+        del buf[:start]
+
+    def flush(self) -> Iterator[bytes]:
+        """
+        输出缓冲区中未以空行结束的最后一个事件
+
+        部分服务端在流结束时不发送结尾空行，需在字节流耗尽后调用。
+
+        返回:
+            事件data字段（bytes）的迭代器
+        """
+        if self._buf.strip():
+            event = _parse_event(self._buf)
+            if event is not None:
+                yield event
+        self._buf.clear()
+
+
+def _parse_event(event: bytes) -> Optional[bytes]:
+    """
+    提取单个SSE事件中的data字段
+
+    参数:
+        event: 不含结尾空行的事件字节
+
+    返回:
+        data字段内容（多行以换行符拼接），无data字段（如注释、心跳）时返回None
+        保持bytes不解码，JSON解析器可直接处理
+    """
+    data_lines = []
+    for line in event.split(b'\n'):
+        if line.startswith(_DATA_PREFIX):
+            line = line[_DATA_PREFIX_LEN:]
+            # 按SSE规范，冒号后的单个空格不属于数据
+            data_lines.append(line[1:] if line.startswith(b' ') else line)
+    if not data_lines:
+        return None
+    if len(data_lines) == 1:
+        return bytes(data_lines[0])
+    return b'\n'.join(data_lines)
+
+
+def _process_stream_event(
+    data: bytes,
     sa: _OpenAI.StreamAccumulator,
     callback: Optional[Callable[[str, bool, int], None]] = None,
     realtime_display: bool = True,
-    show_thinking: bool = True
+    show_thinking: bool = True,
+    validate: bool = False
 ):
     """
-    处理单行SSE流数据的通用逻辑
+    处理单个SSE事件的通用逻辑
 
-    解析 "data: " 开头的SSE行，将chunk添加到累加器。
+    解析事件的data内容，将chunk添加到累加器。
 
     参数:
-        line: SSE数据行
+        data: SSE事件的data内容（已去除 "data: " 前缀的bytes）
         sa: OpenAI流式累加器
         callback: 可选的回调函数
         realtime_display: 是否实时显示
         show_thinking: 是否显示思考过程
+        validate: 是否对chunk执行pydantic校验
 
     返回:
         bool: True表示流结束（遇到[DONE]），False表示继续
     """
-    if line.startswith('data: '):
-        chunk_data = line[6:]  # 移除 'data: ' 前缀
-        if chunk_data.strip() == '[DONE]':
-            return True  # 表示结束
-        try:
-            chunk = _parse_chunk_data(chunk_data)
-            sa.add_chunk(chunk, callback, realtime_display, show_thinking)
-        except json.JSONDecodeError:
-            pass  # 忽略无效的JSON
-        # except Exception as e:
-        #     print(f"处理chunk时出错: {e}")
+    if data.strip() == _DONE_TOKEN:
+        return True  # 表示结束
+    try:
+        chunk = _parse_chunk_data(data, validate)
+        sa.add_chunk(chunk, callback, realtime_display, show_thinking)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        pass  # 忽略无效的JSON（orjson的异常也是其子类）
     return False  # 表示继续
 
 def ProcessStreamResponse(
-    line_iterator,
+    byte_iterator,
     callback: Optional[Callable[[str, bool, int], None]] = None,
     realtime_display: bool = True,
-    show_thinking: bool = True
+    show_thinking: bool = True,
+    validate: bool = False
 ):
     """
     处理同步流式响应
 
-    迭代SSE行，累积chunk并转换为完整的ChatCompletion。
+    逐块读取网络字节，经SSEParser切分为完整事件后累积chunk，
+    最终转换为完整的ChatCompletion。
 
     参数:
-        line_iterator: 行迭代器（如 response.iter_lines()）
+        byte_iterator: 字节块迭代器（如 response.iter_bytes()）
         callback: 可选的回调函数
         realtime_display: 是否实时显示
         show_thinking: 是否显示思考过程
+        validate: 是否对每个chunk执行pydantic校验，默认False（跳过校验以降低CPU开销）
 
     返回:
         完整的ChatCompletion对象
     """
     sa = _OpenAI.StreamAccumulator()
-    for line in line_iterator:
-        if _process_stream_line(line, sa, callback, realtime_display, show_thinking):
-            break
+    parser = SSEParser()
+    try:
+        for raw in byte_iterator:
+            for data in parser.feed(raw):
+                if _process_stream_event(data, sa, callback, realtime_display, show_thinking, validate):
+                    return sa.to_complete_response()
+            sa.flush()  # 每次网络读取的事件处理完即输出，流暂停期间不滞留已缓冲的文本
+        for data in parser.flush():
+            if _process_stream_event(data, sa, callback, realtime_display, show_thinking, validate):
+                break
+    finally:
+        sa.flush()  # 流中途出错时也输出已缓冲的显示内容
     return sa.to_complete_response()
 
 
 async def AsyncProcessStreamResponse(
-    line_iterator,
+    byte_iterator,
     callback: Optional[Callable[[str, bool, int], None]] = None,
     realtime_display: bool = True,
-    show_thinking: bool = True
+    show_thinking: bool = True,
+    validate: bool = False
 ):
     """
     处理异步流式响应
 
-    异步迭代SSE行，累积chunk并转换为完整的ChatCompletion。
+    异步逐块读取网络字节，经SSEParser切分为完整事件后累积chunk，
+    最终转换为完整的ChatCompletion。
 
     参数:
-        line_iterator: 异步行迭代器（如 response.aiter_lines()）
+        byte_iterator: 异步字节块迭代器（如 response.aiter_bytes()）
         callback: 可选的回调函数
         realtime_display: 是否实时显示
         show_thinking: 是否显示思考过程
+        validate: 是否对每个chunk执行pydantic校验，默认False（跳过校验以降低CPU开销）
 
     返回:
         完整的ChatCompletion对象
     """
     sa = _OpenAI.StreamAccumulator()
-    async for line in line_iterator:
-        if _process_stream_line(line, sa, callback, realtime_display, show_thinking):
-            break
+    parser = SSEParser()
+    try:
+        async for raw in byte_iterator:
+            for data in parser.feed(raw):
+                if _process_stream_event(data, sa, callback, realtime_display, show_thinking, validate):
+                    return sa.to_complete_response()
+            sa.flush()  # 每次网络读取的事件处理完即输出，流暂停期间不滞留已缓冲的文本
+        for data in parser.flush():
+            if _process_stream_event(data, sa, callback, realtime_display, show_thinking, validate):
+                break
+    finally:
+        sa.flush()  # 流中途出错时也输出已缓冲的显示内容
     return sa.to_complete_response()
-
-
@@ -11,29 +11,175 @@ Anthropic Claude流式响应处理模块
 - 实时显示和回调支持
 """
 
-import json
-from typing import List, Optional, Callable, Union, Dict, Any
+import io
+from typing import List, Optional, Callable, Union, Dict, Any, Tuple
 from dataclasses import dataclass, field
-from anthropic.types import Message, RawMessageStreamEvent
-from .common_utils import RealTimeDisplayHandler
+from anthropic.types import Message, RawMessageStreamEvent, Usage
+from .common_utils import RealTimeDisplayHandler, json_loads
 
 __all__ = ['StreamAccumulator']
 
+# 无usage信息时的默认值（模块加载时构造一次）
+_ZERO_USAGE = Usage.model_construct(input_tokens=0, output_tokens=0)
 
-def chunks_to_complete_response(chunks: List[RawMessageStreamEvent]) -> Message:
+
+def _finalize_content_block(block_data: Dict[str, Any]) -> None:
     """
-    将流式事件列表转换为完整的Message
+    合并内容块中累积的文本片段
 
-    处理Anthropic的流式事件序列，累积内容块并构造完整的Message对象。
+    流式累积时 text/thinking 直接写入 StringIO 缓冲区，partial_json 以列表形式收集片段，
+    避免长响应中反复字符串拼接的O(N²)开销；内容块结束时统一取出。
+    tool_use 块在此解析完整的JSON输入。
 
     参数:
-        chunks: RawMessageStreamEvent对象列表
+        block_data: 内容块数据字典（原地修改）
+    """
+    for key in ("text", "thinking"):
+        if isinstance(block_data.get(key), io.StringIO):
+            block_data[key] = block_data[key].getvalue()
+    if block_data["type"] == "tool_use":
+        # 解析完整的JSON输入
+        if "partial_json" in block_data:
+            partial_json = "".join(block_data.pop("partial_json"))
+            block_data["input"] = json_loads(partial_json) if partial_json else {}
+        elif not block_data.get("input"):
+            block_data["input"] = {}
+
+
+def _new_message_data() -> Dict[str, Any]:
+    """创建初始的消息数据字典"""
+    return {
+        "id": "",
+        "type": "message",
+        "role": "assistant",
+        "content": [],
+        "model": "",
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": _ZERO_USAGE
+    }
 
-    返回:
-        完整的Message对象
 
-    异常:
-        ValueError: 如果chunks为空
+def _on_message_start(chunk, message_data: Dict[str, Any], content_blocks: List[Optional[Dict[str, Any]]]) -> None:
+    """message_start: 设置消息的基本信息"""
+    message = chunk.message
+    message_data.update({
+        "id": message.id,
+        "model": message.model,
+        "role": message.role,
+        "usage": message.usage or _ZERO_USAGE
+    })
+
+
+def _on_content_block_start(chunk, message_data: Dict[str, Any], content_blocks: List[Optional[Dict[str, Any]]]) -> None:
+    """content_block_start: 开始新的内容块"""
+    content_block = chunk.content_block
+    index = chunk.index
+
+    block_data = {"type": content_block.type,}
+
+    # 根据类型初始化特定字段
+    if content_block.type == "text":
+        block_data["text"] = io.StringIO()
+    elif content_block.type == "tool_use":
+        block_data["id"] = getattr(content_block, "id", None)
+        block_data["name"] = getattr(content_block, "name", None)
+        block_data["input"] = {}
+    elif content_block.type == "thinking":
+        block_data["thinking"] = io.StringIO()
+        block_data["signature"] = None
+
+    # 通用可选字段
+    if hasattr(content_block, "citations"):
+        block_data["citations"] = content_block.citations
+
+    # index为从0开始的连续整数，用列表按位置存放
+    while len(content_blocks) <= index:
+        content_blocks.append(None)
+    content_blocks[index] = block_data
+
+
+def _on_text_delta(block_data: Dict[str, Any], delta) -> None:
+    block_data["text"].write(delta.text)
+
+
+def _on_input_json_delta(block_data: Dict[str, Any], delta) -> None:
+    # 累积工具调用的输入JSON片段
+    block_data.setdefault("partial_json", []).append(delta.partial_json)
+
+
+def _on_thinking_delta(block_data: Dict[str, Any], delta) -> None:
+    block_data["thinking"].write(delta.thinking)
+
+
+def _on_signature_delta(block_data: Dict[str, Any], delta) -> None:
+    block_data["signature"] = delta.signature
+
+
+# 内容块增量类型 -> 处理函数，未知类型直接忽略
+_DELTA_HANDLERS = {
+    "text_delta": _on_text_delta,
+    "input_json_delta": _on_input_json_delta,
+    "thinking_delta": _on_thinking_delta,
+    "signature_delta": _on_signature_delta,
+}
+
+
+def _on_content_block_delta(chunk, message_data: Dict[str, Any], content_blocks: List[Optional[Dict[str, Any]]]) -> None:
+    """content_block_delta: 累积内容块的增量更新"""
+    delta = chunk.delta
+    handler = _DELTA_HANDLERS.get(delta.type)
+    if handler:
+        handler(content_blocks[chunk.index], delta)
+
+
+def _on_content_block_stop(chunk, message_data: Dict[str, Any], content_blocks: List[Optional[Dict[str, Any]]]) -> None:
+    """content_block_stop: 完成内容块"""
+    _finalize_content_block(content_blocks[chunk.index])
+
+
+def _on_message_delta(chunk, message_data: Dict[str, Any], content_blocks: List[Optional[Dict[str, Any]]]) -> None:
+    """message_delta: 更新消息级别的信息"""
+    delta = chunk.delta
+    stop_reason = getattr(delta, "stop_reason", None)
+    if stop_reason:
+        message_data["stop_reason"] = stop_reason
+    stop_sequence = getattr(delta, "stop_sequence", None)
+    if stop_sequence:
+        message_data["stop_sequence"] = stop_sequence
+    usage = getattr(chunk, "usage", None)
+    if usage:
+        # message_delta的usage是MessageDeltaUsage（只含累计token数等字段），
+        # 合并到message_start的Usage上重建，保证结果仍为Usage且保留service_tier等字段
+        merged = dict(message_data['usage'])
+        merged.update((k, v) for k, v in usage if v is not None)
+        message_data['usage'] = Usage.model_construct(**merged)
+
+
+# 事件类型 -> 处理函数，ping 和 message_stop 等事件不在表中，直接忽略
+_EVENT_HANDLERS = {
+    "message_start": _on_message_start,
+    "content_block_start": _on_content_block_start,
+    "content_block_delta": _on_content_block_delta,
+    "content_block_stop": _on_content_block_stop,
+    "message_delta": _on_message_delta,
+}
+
+
+def _absorb_event(
+    message_data: Dict[str, Any],
+    content_blocks: List[Optional[Dict[str, Any]]],
+    chunk: RawMessageStreamEvent
+) -> None:
+    """
+    将单个流式事件累积到消息数据和内容块中
+
+    按事件类型在 _EVENT_HANDLERS 中查找处理函数，一次字典查找代替逐个字符串比较。
+
+    参数:
+        message_data: 消息级别数据（原地修改）
+        content_blocks: 按index排列的内容块列表（原地修改）
+        chunk: RawMessageStreamEvent对象
 
     事件类型:
         - message_start: 消息开始，提供基础信息
@@ -41,126 +187,79 @@ def chunks_to_complete_response(chunks: List[RawMessageStreamEvent]) -> Message:
         - content_block_delta: 内容块增量更新
         - content_block_stop: 内容块结束
         - message_delta: 消息级别更新
-        - message_stop: 消息结束
+        - message_stop: 消息结束（忽略）
     """
-    if not chunks:
-        raise ValueError("No chunks provided")
+    handler = _EVENT_HANDLERS.get(chunk.type)
+    if handler:
+        handler(chunk, message_data, content_blocks)
 
-    # 初始化响应数据
-    message_data = {
-        "id": "",
-        "type": "message",
-        "role": "assistant",
-        "content": [],
-        "model": "",
-        "stop_reason": None,
-        "stop_sequence": None,
-        "usage": {"input_tokens": 0, "output_tokens": 0}
-    }
-
-    # 用于累积内容块（按index分组）
-    content_blocks = {}
 
-    for chunk in chunks:
-        event_type = chunk.type
-
-        if event_type == "message_start":
-            # 设置消息的基本信息
-            message = chunk.message
-            message_data.update({
-                "id": message.id,
-                "model": message.model,
-                "role": message.role,
-                "usage": message.usage.dict() if message.usage else {"input_tokens": 0, "output_tokens": 0}
-            })
-
-        elif event_type == "content_block_start":
-            # 开始新的内容块
-            content_block = chunk.content_block
-            index = chunk.index
-
-            block_data = {"type": content_block.type,}
-
-            # 根据类型初始化特定字段
-            if content_block.type == "text":
-                block_data["text"] = ""
-            elif content_block.type == "tool_use":
-                block_data["id"] = getattr(content_block, "id", None)
-                block_data["name"] = getattr(content_block, "name", None)
-                block_data["input"] = {}
-            elif content_block.type == "thinking":
-                block_data["thinking"] = ""
-                block_data["signature"] = None
-
-            # 通用可选字段
-            if hasattr(content_block, "citations"):
-                block_data["citations"] = content_block.citations
-
-            content_blocks[index] = block_data
-
-        elif event_type == "content_block_delta":
-            # 累积内容块的增量更新
-            index = chunk.index
-            delta = chunk.delta
+def _build_message(message_data: Dict[str, Any], content_blocks: List[Optional[Dict[str, Any]]]) -> Message:
+    """
+    由累积的消息数据和内容块构造完整的Message
 
-            assert index in content_blocks,"index 应在 content_blocks 中"
-            if delta.type == "text_delta":
-                content_blocks[index]["text"] += delta.text
-            elif delta.type == "input_json_delta":
-                # 累积工具调用的输入JSON
-                if "partial_json" not in content_blocks[index]:
-                    content_blocks[index]["partial_json"] = ""
-                content_blocks[index]["partial_json"] += delta.partial_json
-            elif delta.type == "thinking_delta":
-                content_blocks[index]["thinking"] += delta.thinking
-            elif delta.type == 'signature_delta':
-                content_blocks[index]['signature'] = delta.signature
-
-        elif event_type == "content_block_stop":
-            # 完成内容块
-            index = chunk.index
-            assert index in content_blocks,"index 应在 content_blocks 中"
-            if content_blocks[index]["type"] == "tool_use":
-                # 解析完整的JSON输入
-                if "partial_json" in content_blocks[index]:
-                    content_blocks[index]["input"] = json.loads(content_blocks[index]["partial_json"])
-                    del content_blocks[index]["partial_json"]
-                else:
-                    content_blocks[index]["input"] = {}
-            # elif content_blocks[index]['type'] in ['text','thinking']:
-            # 这种情形前面已经整合好，无需单独处理
-
-        elif event_type == "message_delta":
-            # 更新消息级别的信息
-            delta = chunk.delta
-            if hasattr(delta, "stop_reason") and delta.stop_reason:
-                message_data["stop_reason"] = delta.stop_reason
-            if hasattr(delta, "stop_sequence") and delta.stop_sequence:
-                message_data["stop_sequence"] = delta.stop_sequence
-            if hasattr(chunk, "usage") and chunk.usage:
-                message_data['usage'] = chunk.usage.dict()
-        # 忽略 ping 和 message_stop 事件
+    参数:
+        message_data: 消息级别数据
+        content_blocks: 按index排列的内容块列表
 
-    # 构建最终的内容数组
-    message_data['content'] = list(content_blocks.values())
+    返回:
+        完整的Message对象
+    """
+    # 构建最终的内容数组（流被截断时可能缺少 content_block_stop，需补做合并）
+    message_data['content'] = [block_data for block_data in content_blocks if block_data is not None]
+    for block_data in message_data['content']:
+        _finalize_content_block(block_data)
 
     # 创建Message对象
     return Message.model_construct(**message_data)
 
 
-@dataclass
+def chunks_to_complete_response(chunks: List[RawMessageStreamEvent]) -> Message:
+    """
+    将流式事件列表转换为完整的Message
+
+    处理Anthropic的流式事件序列，累积内容块并构造完整的Message对象。
+    StreamAccumulator 在 add_chunk 中增量完成同样的累积，此函数用于已有完整事件列表的场景。
+
+    参数:
+        chunks: RawMessageStreamEvent对象列表
+
+    返回:
+        完整的Message对象
+
+    异常:
+        ValueError: 如果chunks为空
+    """
+    if not chunks:
+        raise ValueError("No chunks provided")
+
+    message_data = _new_message_data()
+    # 用于累积内容块（按index排列）
+    content_blocks = []
+    for chunk in chunks:
+        _absorb_event(message_data, content_blocks, chunk)
+
+    return _build_message(message_data, content_blocks)
+
+
+@dataclass(slots=True)
 class StreamAccumulator(RealTimeDisplayHandler):
     """
     Anthropic Claude流式响应累加器
 
-    累积流式RawMessageStreamEvent并提供转换为完整Message的功能。
+    在 add_chunk 中增量累积流式RawMessageStreamEvent，事件吸收后即丢弃，
+    不保留事件列表，长响应的峰值内存约减半。
     继承RealTimeDisplayHandler以支持实时显示。
 
     属性:
-        chunks: 累积的RawMessageStreamEvent列表
+        _message_data: 累积的消息级别数据
+        _content_blocks: 按index排列累积的内容块
+        _chunk_count: 已接收的事件数量
     """
 
-    chunks: List[RawMessageStreamEvent] = field(default_factory=list)
+    _message_data: Dict[str, Any] = field(default_factory=_new_message_data)
+    _content_blocks: List[Optional[Dict[str, Any]]] = field(default_factory=list)
+    _chunk_count: int = 0
 
     def add_chunk(
         self,
@@ -182,15 +281,17 @@ class StreamAccumulator(RealTimeDisplayHandler):
         to_complete_response()
 
         【内部调用】
-        1. self.chunks.append(chunk)
-           - 累积事件到列表
+        1. _absorb_event(self._message_data, self._content_blocks, chunk)
+           - 将事件增量累积到消息数据和内容块中，事件本身不保留
+
+        2. 若 callback 为空且 realtime_display=False，直接返回
 
-        2. 判断事件类型并提取内容:
+        3. 判断事件类型并提取内容:
            if chunk.type == "content_block_delta":
                ├─ delta.type == "text_delta": 提取 delta.text
                └─ delta.type == "thinking_delta": 提取 delta.thinking
 
-        3. 执行回调和显示:
+        4. 执行回调和显示:
            ├─ callback(text_content, is_thinking, chunk_index)
            └─ self._handle_realtime_display(...)
 
@@ -212,7 +313,7 @@ class StreamAccumulator(RealTimeDisplayHandler):
         show_thinking: 是否显示思考内容
 
         【返回】
-        None（副作用：修改 self.chunks，执行回调和打印）
+        None（副作用：更新累积的消息数据，执行回调和打印）
 
         【Anthropic 特点】
         - 事件驱动：需要处理多种事件类型
@@ -220,8 +321,13 @@ class StreamAccumulator(RealTimeDisplayHandler):
         - 内容块索引：通过 chunk.index 标识不同的内容块
         - 渐进式构建：通过事件序列逐步构建完整消息
         """
-        self.chunks.append(chunk)
-        chunk_index = len(self.chunks) - 1
+        _absorb_event(self._message_data, self._content_blocks, chunk)
+        chunk_index = self._chunk_count
+        self._chunk_count += 1
+
+        # 既无回调也不实时显示时（只需最终结果），无需提取增量文本
+        if callback is None and not realtime_display:
+            return
 
         # 提取文本内容和判断是否为thinking
         text_content = ""
@@ -249,7 +355,7 @@ class StreamAccumulator(RealTimeDisplayHandler):
 
     def to_complete_response(self) -> Message:
         """
-        将累积的事件序列转换为完整的 Message 对象
+        将增量累积的数据转换为完整的 Message 对象
 
         【调用链】
         _handle_sync()
@@ -262,26 +368,27 @@ class StreamAccumulator(RealTimeDisplayHandler):
         返回 Message
 
         【内部调用】
-        chunks_to_complete_response(self.chunks)
+        _build_message(self._message_data, self._content_blocks)
             ↓
-        处理逻辑（按事件类型分别处理）:
+        累积逻辑（已在 add_chunk 中按事件类型逐个完成）:
             1. message_start:
                └─ 提取基础信息: id, model, role, usage
 
             2. content_block_start:
-               └─ 初始化内容块: {"type": ..., "text": ""} 或 {"type": "thinking", "thinking": ""}
+               └─ 初始化内容块: {"type": "text", "text": StringIO()} 或
+                  {"type": "thinking", "thinking": StringIO(), "signature": None}
 
             3. content_block_delta:
-               └─ 累积增量: text += delta.text 或 thinking += delta.thinking
+               └─ 累积增量片段: text/thinking 写入 StringIO 缓冲区，partial_json 追加到列表
 
             4. content_block_stop:
-               └─ 完成内容块（处理 tool_use 的 JSON）
+               └─ 完成内容块（取出 StringIO 中的文本，解析 tool_use 的 JSON）
 
             5. message_delta:
                └─ 更新消息级别信息: stop_reason, usage
 
             6. 构造 Message:
-               └─ content = list(content_blocks.values())
+               └─ content = 按index排列的内容块（跳过空位）
 
         【被调用】
         - BaseSDKChatBot._handle_sync() - 流式处理完成后
@@ -299,6 +406,35 @@ class StreamAccumulator(RealTimeDisplayHandler):
         - 内容块类型：text, thinking, tool_use 等
         - 增量累积：通过 delta 事件逐步构建内容
         - 渐进式元数据：usage 等信息在事件流中逐步更新
+
+        异常:
+            ValueError: 如果未接收到任何事件
+        """
+        self.flush()
+        if not self._chunk_count:
+            raise ValueError("No chunks provided")
+        return _build_message(self._message_data, self._content_blocks)
+
+    def to_text(self) -> Tuple[str, str]:
         """
-        return chunks_to_complete_response(self.chunks)
+        只返回累积的文本，不构造 Message
+
+        只需要最终文本时（如自行驱动累加器、按回调收集结果），
+        可跳过 pydantic 模型的构造。
 
+        返回:
+            (text, thinking)，分别为所有 text 块和 thinking 块按顺序拼接的内容
+        """
+        self.flush()
+        text_parts, thinking_parts = [], []
+        for block_data in self._content_blocks:
+            if block_data is None:
+                continue
+            for key, parts in (("text", text_parts), ("thinking", thinking_parts)):
+                value = block_data.get(key)
+                if isinstance(value, io.StringIO):
+                    # 未结束的内容块仍为缓冲区
+                    value = value.getvalue()
+                if value:
+                    parts.append(value)
+        return "".join(text_parts), "".join(thinking_parts)
@@ -14,74 +14,129 @@ Google Gemini流式响应处理模块
     Google genai流式响应处理: https://github.com/googleapis/python-genai/issues/1092
 """
 
+import io
 from dataclasses import dataclass, field
-from typing import Callable, Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Any, Tuple
 from google.genai import types
 
 from .common_utils import RealTimeDisplayHandler
 
 __all__ = ['StreamAccumulator']
 
+# 构造完整响应时单独合并、不从最新chunk复制的字段
+_CANDIDATE_EXCLUDED_FIELDS = ('content', 'citation_metadata')
+_RESPONSE_EXCLUDED_FIELDS = ('candidates',)
+
+# 跳过校验的构造函数（模块级绑定，避免热路径中每次重复查找模块属性）
+_P = types.Part.model_construct
+_CT = types.Content.model_construct
+_CA = types.Candidate.model_construct
+_CM = types.CitationMetadata.model_construct
+_GCR = types.GenerateContentResponse.model_construct
+
+
+def _new_candidate_data() -> Dict[str, Any]:
+    """创建单个candidate的初始累积数据"""
+    return {
+        'role': None,
+        'parts': [],                # 已合并完成的parts
+        'text_run': io.StringIO(),  # 当前连续同类型文本parts的文本缓冲区
+        'run_is_thinking': False,   # 当前文本片段是否为thinking
+        'citation_metadatas': [],   # 引用信息列表
+        'candidate': None           # 最近一个带内容的candidate（用于提取元信息）
+    }
+
+
+def _close_text_run(candidate_data: Dict[str, Any]) -> None:
+    """将当前连续的同类型文本一次性取出为一个Part"""
+    text_run = candidate_data['text_run']
+    if not text_run.tell():
+        return
+    text = text_run.getvalue()
+    candidate_data['text_run'] = io.StringIO()
+    if candidate_data['run_is_thinking']:
+        candidate_data['parts'].append(_P(text=text, thought=True))
+    else:
+        candidate_data['parts'].append(_P(text=text))
+
+
+def _append_text(candidate_data: Dict[str, Any], text: str, is_thinking: bool) -> None:
+    """
+    追加一段文本，相邻的同类型文本合并（thinking和普通文本分别合并）
 
-def _consolidate_contents(contents: List[types.Content]) -> types.Content:
+    文本片段先写入缓冲区，类型切换或遇到非文本part时再一次性取出。
     """
-    合并多个Content对象为单个Content
+    if candidate_data['run_is_thinking'] != is_thinking and candidate_data['text_run'].tell():
+        _close_text_run(candidate_data)
+    candidate_data['text_run'].write(text)
+    candidate_data['run_is_thinking'] = is_thinking
 
-    只需要合并文本类型的parts，其他类型的parts（如图片等）不会跨越chunks。
-    相邻的同类型文本parts会被合并（thinking和普通文本分别合并）。
 
-    参数:
-        contents: Content对象列表
+def _append_part(candidate_data: Dict[str, Any], part: types.Part) -> Optional[str]:
+    """
+    追加单个part
+
+    part.text 和 part.thought 只读取一次，调用方可复用返回值，无需再次访问属性。
 
     返回:
-        合并后的单个Content对象
+        文本part返回其文本，非文本part返回None
+    """
+    text = part.text
+    if text:
+        _append_text(candidate_data, text, bool(part.thought))
+        return text
+    # 非文本类型（如图片）直接添加，不跨chunks
+    _close_text_run(candidate_data)
+    candidate_data['parts'].append(part)
+    return None
+
+
+def _absorb_candidate(candidate_data: Dict[str, Any], candidate: types.Candidate) -> None:
+    """
+    累积单个candidate的角色、引用信息和元信息（parts由调用方逐个 _append_part）
+
+    参数:
+        candidate_data: 该candidate的累积数据（原地修改）
+        candidate: 当前chunk中的Candidate对象（需带content）
+    """
+    if candidate_data['role'] is None:
+        candidate_data['role'] = candidate.content.role
+    if candidate.citation_metadata is not None:
+        candidate_data['citation_metadatas'].append(candidate.citation_metadata)
+    # 只保留最新的candidate，元信息在结束时提取一次
+    candidate_data['candidate'] = candidate
+
+
+def _shallow_fields(model, exclude: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    浅层读取pydantic模型的字段（跳过exclude和值为None的字段）
 
-    参考:
-        https://github.com/googleapis/python-genai/issues/1092
+    相比 model.dict() 不会递归序列化整个子树（content、parts、safety_ratings等），
+    子对象原样传给新模型的构造函数。
     """
-    if not contents:
-        return types.Content(parts=[], role="model")
-
-    consolidated_role = contents[0].role or "model"
-
-    # 收集所有parts
-    all_parts = []
-    for content in contents:
-        if content.parts:
-            all_parts.extend(content.parts)
-
-    # 合并相邻的同类型文本parts
-    consolidated_parts = []
-    i = 0
-
-    while i < len(all_parts):
-        current_part = all_parts[i]
-
-        if hasattr(current_part, 'text') and current_part.text:
-            # 判断是否为thinking类型
-            is_thinking = bool(getattr(current_part, 'thought', False))
-            consolidated_text = current_part.text
-
-            # 合并后续相同类型的文本parts
-            j = i + 1
-            while (j < len(all_parts) and
-                   hasattr(all_parts[j], 'text') and all_parts[j].text and
-                   (hasattr(all_parts[j], 'thought') and all_parts[j].thought) == is_thinking):
-                consolidated_text += all_parts[j].text
-                j += 1
-
-            # 创建合并后的Part
-            if is_thinking:
-                consolidated_parts.append(types.Part(text=consolidated_text, thought=True))
-            else:
-                consolidated_parts.append(types.Part(text=consolidated_text))
-            i = j
-        else:
-            # 非文本类型（如图片）直接添加，不跨chunks
-            consolidated_parts.append(current_part)
-            i += 1
-
-    return types.Content(parts=consolidated_parts, role=consolidated_role)
+    return {
+        name: value
+        for name in type(model).model_fields
+        if name not in exclude and (value := getattr(model, name)) is not None
+    }
+
+
+def _build_candidate(candidate_data: Dict[str, Any]) -> types.Candidate:
+    """由累积数据构造完整的Candidate"""
+    _close_text_run(candidate_data)
+    content = _CT(parts=candidate_data['parts'], role=candidate_data['role'] or "model")
+
+    # 提取元信息
+    metadata = {}
+    if candidate_data['candidate'] is not None:
+        metadata = _shallow_fields(candidate_data['candidate'], _CANDIDATE_EXCLUDED_FIELDS)
+
+    # 合并citation_metadata
+    citation_metadata = _consolidate_citation_metadatas(candidate_data['citation_metadatas'])
+    if citation_metadata:
+        metadata['citation_metadata'] = citation_metadata
+
+    return _CA(content=content, **metadata)
 
 
 def _consolidate_citation_metadatas(
@@ -90,7 +145,7 @@ def _consolidate_citation_metadatas(
     """
     合并多个CitationMetadata对象
 
-    收集所有citation sources并按startIndex排序。
+    收集所有citation sources并按start_index排序。
 
     参数:
         citation_metadatas: CitationMetadata对象列表
@@ -101,23 +156,83 @@ def _consolidate_citation_metadatas(
     if not citation_metadatas:
         return None
 
-    # 过滤掉None值和空的citation metadata
-    valid_metadatas = [cm for cm in citation_metadatas if cm is not None]
-    if not valid_metadatas:
-        return None
-
-    # 收集所有的citation sources
+    # 收集所有的citation sources（跳过None值和空的citation metadata）
     all_citation_sources = []
-    for metadata in valid_metadatas:
-        all_citation_sources.extend(metadata.citations)
+    for metadata in citation_metadatas:
+        if metadata is not None and metadata.citations:
+            all_citation_sources.extend(metadata.citations)
 
     if not all_citation_sources:
         return None
 
-    # 按startIndex排序，确保引用顺序正确
-    all_citation_sources.sort(key=lambda cs: cs.startIndex)
+    # 按start_index排序，确保引用顺序正确；流式返回的引用通常已有序，此时跳过排序
+    start_indices = [cs.start_index or 0 for cs in all_citation_sources]
+    if any(a > b for a, b in zip(start_indices, start_indices[1:])):
+        all_citation_sources.sort(key=lambda cs: cs.start_index or 0)
+
+    return _CM(citations=all_citation_sources)
+
+
+def _get_candidate_data(
+    candidates_data: List[Dict[str, Any]],
+    candidate_idx: int,
+    candidate: types.Candidate
+) -> Dict[str, Any]:
+    """
+    按candidate索引取累积数据，首次出现时创建
+
+    candidate_idx 来自对 chunk.candidates 的 enumerate，是从0开始的连续整数，
+    用列表按位置存放，代替按索引的字典查找。
+    candidate.index 的检查只在首次出现时进行一次，不在每个chunk上重复。
+    """
+    if candidate_idx == len(candidates_data):
+        assert candidate.index is None, "当前(2025) Google Gemini API 返回值中，这一字段总是 None"
+        candidates_data.append(_new_candidate_data())
+    return candidates_data[candidate_idx]
+
+
+def _absorb_chunk(
+    candidates_data: List[Dict[str, Any]],
+    chunk: types.GenerateContentResponse
+) -> None:
+    """
+    将单个chunk的所有candidate累积到candidates_data中
 
-    return types.CitationMetadata(all_citation_sources)
+    参数:
+        candidates_data: 按candidate索引排列的累积数据（原地修改）
+        chunk: GenerateContentResponse对象
+    """
+    if not chunk.candidates:
+        return
+
+    for candidate_idx, candidate in enumerate(chunk.candidates):
+        candidate_data = _get_candidate_data(candidates_data, candidate_idx, candidate)
+        if not candidate.content:
+            continue
+        _absorb_candidate(candidate_data, candidate)
+        for part in candidate.content.parts or ():
+            _append_part(candidate_data, part)
+
+
+def _build_response(
+    candidates_data: List[Dict[str, Any]],
+    last_chunk: types.GenerateContentResponse
+) -> types.GenerateContentResponse:
+    """
+    由累积的candidate数据和最后一个chunk构造完整的GenerateContentResponse
+
+    参数:
+        candidates_data: 按candidate索引排列的累积数据
+        last_chunk: 最后一个chunk，提供usage_metadata等全局信息
+
+    返回:
+        完整的GenerateContentResponse对象
+    """
+    complete_candidates = [_build_candidate(candidate_data) for candidate_data in candidates_data]
+
+    # 使用最后一个 chunk 的全局信息构建完整响应（字段均取自已解析的chunk，用model_construct跳过校验）
+    last_chunk_dict = _shallow_fields(last_chunk, _RESPONSE_EXCLUDED_FIELDS)
+    return _GCR(candidates=complete_candidates, **last_chunk_dict)
 
 
 def chunks_to_complete_response(chunks: List[types.GenerateContentResponse]) -> types.GenerateContentResponse:
@@ -126,6 +241,7 @@ def chunks_to_complete_response(chunks: List[types.GenerateContentResponse]) ->
 
     遍历所有chunk，按candidate分组累积内容、元数据和引用信息，
     最终构造完整的GenerateContentResponse对象。
+    StreamAccumulator 在 add_chunk 中增量完成同样的累积，此函数用于已有完整chunk列表的场景。
 
     参数:
         chunks: GenerateContentResponse对象列表
@@ -137,91 +253,35 @@ def chunks_to_complete_response(chunks: List[types.GenerateContentResponse]) ->
         ValueError: 如果chunks为空
 
     处理逻辑:
-        1. 按candidate_idx分组累积contents
-        2. 合并文本parts和citation metadata
+        1. 按candidate_idx分组累积parts（相邻同类型文本随即合并）
+        2. 合并citation metadata，提取最新candidate的元信息
         3. 使用最后一个chunk的全局信息构建完整响应
     """
     if not chunks:
         raise ValueError("No chunks received")
 
-    # 按candidate索引分组收集数据
-    candidates_contents: Dict[int, List] = {}              # 内容列表
-    candidates_metadata: Dict[int, Dict] = {}              # 元数据
-    candidates_citation_metadatas: Dict[int, List] = {}    # 引用信息列表
-
+    candidates_data: List[Dict[str, Any]] = []
     for chunk in chunks:
+        _absorb_chunk(candidates_data, chunk)
 
-        if not chunk.candidates:
-            continue
-
-        for candidate_idx,candidate in enumerate(chunk.candidates):
-            assert candidate.index is None, "当前(2025) Google Gemini API 返回值中，这一字段总是 None"
-
-            candidate_dict = candidate.dict()
-            candidate_dict.pop('content')
-            # 初始化 candidate 的内容信息
-            if candidate_idx not in candidates_contents:
-                candidates_contents[candidate_idx] = []
-            # 累积 candidate 的内容信息
-            if not candidate.content:
-                continue
-            else:
-                candidates_contents[candidate_idx].append(candidate.content)
-
-            if 'citation_metadata' in candidate_dict:
-                candidate_dict.pop('citation_metadata')
-                # 初始化 candidate 的引用信息
-                if candidate_idx not in candidates_citation_metadatas:
-                    candidates_citation_metadatas[candidate_idx] = []
-                candidates_citation_metadatas[candidate_idx].append(candidate.citation_metadata)
-
-            # 初始化 candidate 的元信息
-            if candidate_idx not in candidates_metadata:
-                candidates_metadata[candidate_idx] = {}
-            # 更新candidate的元信息（每次chunk都更新，保存最新状态）
-            candidates_metadata[candidate_idx].update(candidate_dict)
-
-    complete_candidates = []
+    return _build_response(candidates_data, chunks[-1])
 
-    for candidate_idx in sorted(candidates_contents.keys()):
-        # 整合 contents
-        content = _consolidate_contents(candidates_contents[candidate_idx])
-
-        # 提取元信息
-        metadata = candidates_metadata[candidate_idx]
-
-        # 提取citation_metadata
-        citation_metadata = _consolidate_citation_metadatas(
-            candidates_citation_metadatas[candidate_idx])
-        if citation_metadata:
-            metadata['citation_metadata'] = citation_metadata
-
-        # 创建新 candidate
-        complete_candidate = types.Candidate(content=content, **metadata)
-
-        complete_candidates.append(complete_candidate)
-
-    # 使用最后一个 chunk 的全局信息构建完整响应
-    last_chunk_dict = chunks[-1].dict()
-    last_chunk_dict.pop('candidates')
-    complete_response = types.GenerateContentResponse(
-        candidates=complete_candidates, **last_chunk_dict)
-
-    return complete_response
-
-@dataclass
+@dataclass(slots=True)
 class StreamAccumulator(RealTimeDisplayHandler):
     """
     Google Gemini流式响应累加器
 
-    累积流式GenerateContentResponse并提供转换为完整响应的功能。
+    在 add_chunk 中增量累积流式GenerateContentResponse（相邻同类型文本parts随即合并），
+    只保留最后一个chunk用于提取全局信息，结束时无需重新扫描所有chunk。
     继承RealTimeDisplayHandler以支持实时显示。
 
     属性:
-        chunks: 累积的GenerateContentResponse列表
+        _candidates: 按candidate索引排列的累积数据
+        _last_chunk: 最后一个chunk（提供usage_metadata等全局信息）
     """
 
-    chunks: List[types.GenerateContentResponse] = field(default_factory=list)
+    _candidates: List[Dict[str, Any]] = field(default_factory=list)
+    _last_chunk: Optional[types.GenerateContentResponse] = None
 
     def add_chunk(
         self,
@@ -243,13 +303,15 @@ class StreamAccumulator(RealTimeDisplayHandler):
         to_complete_response()
 
         【内部调用】
-        1. self.chunks.append(chunk)
-           - 累积 chunk 到列表
+        1. self._last_chunk = chunk
+           - 只保留最后一个 chunk
 
-        2. 遍历所有 candidate 和 parts:
+        2. 遍历所有 candidate 和 parts（累积与回调在同一次遍历中完成）:
            for candidate in chunk.candidates:
+               _absorb_candidate(...)
                for part in candidate.content.parts:
-                   ├─ 判断是否为思考: is_thinking = part.thought
+                   ├─ _append_part(...): 累积 part，相邻同类型文本合并
+                   ├─ 判断是否为思考: 复用 _append_part 记录的 run_is_thinking
                    ├─ callback(part.text, is_thinking, candidate_idx)
                    └─ self._handle_realtime_display(...)
 
@@ -268,7 +330,7 @@ class StreamAccumulator(RealTimeDisplayHandler):
         show_thinking: 是否显示思考内容
 
         【返回】
-        None（副作用：修改 self.chunks，执行回调和打印）
+        None（副作用：修改 self._candidates，执行回调和打印）
 
         【Google 特点】
         - 完整结构：每个 chunk 都是完整的 GenerateContentResponse
@@ -276,33 +338,37 @@ class StreamAccumulator(RealTimeDisplayHandler):
         - 思考标识：通过 part.thought 属性区分思考和普通文本
         - 类型一致：chunk 与 complete response 类型相同
         """
-        self.chunks.append(chunk)
+        self._last_chunk = chunk
         if not chunk.candidates:
             return
 
-        # 对每个candidate处理callback和realtime_display
+        # 对每个candidate累积内容，并处理callback和realtime_display
         for candidate_idx, candidate in enumerate(chunk.candidates):
-            if not candidate.content or not candidate.content.parts:
+            candidate_data = _get_candidate_data(self._candidates, candidate_idx, candidate)
+            if not candidate.content:
+                continue
+            _absorb_candidate(candidate_data, candidate)
+            if not candidate.content.parts:
                 continue
-            assert candidate.index is None, "当前(2025) Google Gemini API 返回值中，这一字段总是 None"
 
+            # 只实时显示第一个candidate
+            display = realtime_display and candidate_idx == 0
             for part in candidate.content.parts:
-                if not part.text:
+                text = _append_part(candidate_data, part)
+                if not text:
                     continue
-                is_thinking = bool(getattr(part, 'thought', False))
-                text = part.text
+                is_thinking = candidate_data['run_is_thinking']
 
                 # 执行回调
                 if callback:
                     callback(text, is_thinking, candidate_idx)
 
-                # 实时显示第一个candidate
-                if realtime_display and candidate_idx == 0:
+                if display:
                     self._handle_realtime_display(text, is_thinking, show_thinking)
 
     def to_complete_response(self) -> types.GenerateContentResponse:
         """
-        将累积的 chunks 转换为完整的 GenerateContentResponse 对象
+        将增量累积的数据转换为完整的 GenerateContentResponse 对象
 
         【调用链】
         _handle_sync()
@@ -315,16 +381,15 @@ class StreamAccumulator(RealTimeDisplayHandler):
         返回 GenerateContentResponse
 
         【内部调用】
-        chunks_to_complete_response(self.chunks)
+        _build_response(self._candidates, self._last_chunk)
             ↓
-        处理逻辑:
+        累积逻辑（已在 add_chunk 中逐个chunk完成）:
             1. 按 candidate_idx 分组收集:
-               ├─ contents: 所有 Content 对象列表
-               ├─ metadata: 元数据（finish_reason, safety_ratings等）
+               ├─ parts: 相邻的普通文本/思考 parts 分别合并
+               ├─ candidate: 最新的 Candidate（提取 finish_reason, safety_ratings 等元数据）
                └─ citation_metadatas: 引用信息列表
-            2. 合并同类型的文本 parts:
-               ├─ 相邻的普通文本 parts 合并
-               └─ 相邻的思考 parts 合并
+        处理逻辑:
+            2. 拼接最后一段文本 part
             3. 合并引用信息（按 startIndex 排序）
             4. 使用最后 chunk 的全局信息构建完整响应
 
@@ -343,6 +408,35 @@ class StreamAccumulator(RealTimeDisplayHandler):
         - Parts 合并：相邻同类型的文本 parts 会被合并
         - Citation 处理：收集并排序所有引用信息
         - 类型一致：返回类型与输入 chunk 类型相同
+
+        异常:
+            ValueError: 如果未接收到任何 chunk
+        """
+        self.flush()
+        if self._last_chunk is None:
+            raise ValueError("No chunks received")
+        return _build_response(self._candidates, self._last_chunk)
+
+    def to_text(self, index: int = 0) -> Tuple[str, str]:
         """
-        return chunks_to_complete_response(self.chunks)
+        只返回累积的文本，不构造 GenerateContentResponse
+
+        只需要最终文本时（如自行驱动累加器、按回调收集结果），
+        可跳过 pydantic 模型的构造。不会拼接当前文本片段，之后仍可继续 add_chunk。
 
+        参数:
+            index: candidate 的索引，默认 0
+
+        返回:
+            (text, thinking_text)，不存在的 candidate 返回 ('', '')
+        """
+        self.flush()
+        if index >= len(self._candidates):
+            return '', ''
+        candidate_data = self._candidates[index]
+        text_parts, thinking_parts = [], []
+        for part in candidate_data['parts']:
+            if part.text:
+                (thinking_parts if part.thought else text_parts).append(part.text)
+        (thinking_parts if candidate_data['run_is_thinking'] else text_parts).append(candidate_data['text_run'].getvalue())
+        return ''.join(text_parts), ''.join(thinking_parts)
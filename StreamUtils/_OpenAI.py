@@ -10,8 +10,9 @@ OpenAI流式响应处理模块
 - 实时显示和回调支持
 """
 
+import io
 from dataclasses import dataclass, field
-from typing import Optional, Callable, List
+from typing import Optional, Callable, List, Dict, Any, Tuple
 from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
 from openai.types.chat.chat_completion import Choice
 
@@ -19,109 +20,123 @@ from .common_utils import RealTimeDisplayHandler
 
 __all__ = ['StreamAccumulator']
 
+# 跳过校验的构造函数（模块级绑定，避免每个choice重复查找全局名和属性）
+_CCM = ChatCompletionMessage.model_construct
+_CH = Choice.model_construct
+_CC = ChatCompletion.model_construct
 
-def _chatcompletionchunk_delta_has_reasoning(delta):
-    """
-    检查delta是否包含推理内容
 
-    DeepSeek等模型通过reasoning_content属性提供推理过程。
+def _new_completion_data() -> Dict[str, Any]:
+    """创建初始的响应数据字典"""
+    return {
+        'id': None,
+        'created': None,
+        'model': None,
+        'system_fingerprint': None,
+        'choices': [],  # 按choice.index排列的choice数据
+        'usage': None
+    }
 
-    参数:
-        delta: ChatCompletionChunk的delta对象
 
-    返回:
-        bool: 是否包含推理内容
+def _absorb_chunk_info(completion_data: Dict[str, Any], chunk: ChatCompletionChunk) -> None:
     """
-    return hasattr(delta, 'reasoning_content') and delta.reasoning_content
+    累积chunk级别的信息（基础信息和usage）
 
-def chunks_to_complete_response(chunks: List[ChatCompletionChunk]) -> ChatCompletion:
+    参数:
+        completion_data: 响应数据（原地修改）
+        chunk: ChatCompletionChunk对象
     """
-    将流式chunk列表转换为完整的ChatCompletion响应
+    # 从第一个chunk获取基础信息
+    if completion_data['id'] is None:
+        completion_data['id'] = chunk.id
+        completion_data['created'] = chunk.created
+        completion_data['model'] = chunk.model
+        completion_data['system_fingerprint'] = chunk.system_fingerprint
 
-    遍历所有chunk，累积内容、推理内容和元数据，
-    最终构造完整的ChatCompletion对象。
+    # 获取usage信息（仅在最后一个chunk中）
+    if chunk.usage:
+        completion_data['usage'] = chunk.usage
+
+
+def _absorb_choice(choices_data: List[Optional[Dict[str, Any]]], choice) -> Tuple[Optional[str], Optional[str]]:
+    """
+    将单个choice的增量累积到choices_data中
 
     参数:
-        chunks: ChatCompletionChunk对象列表
+        choices_data: 按choice.index排列的choice数据（原地修改）
+        choice: ChatCompletionChunk中的Choice对象
 
     返回:
-        完整的ChatCompletion对象
-
-    处理逻辑:
-        1. 从首个chunk提取基础信息（id、model等）
-        2. 按choice.index分组累积内容
-        3. 合并所有delta.content和delta.reasoning_content
-        4. 从最后一个chunk获取usage信息
+        (reasoning_content, content)，供调用方在同一次遍历中回调和显示
     """
-    # 收集基础信息的变量
-    id = None
-    created = None
-    model = None
-    system_fingerprint = None
-
-    # 用于收集所有choice的信息（按index分组）
-    choices_data = {}
-    usage = None
+    index = choice.index
+    delta = choice.delta
+
+    # 初始化choice数据结构（index为从0开始的小整数，用列表按位置存放）
+    while len(choices_data) <= index:
+        choices_data.append(None)
+    choice_data = choices_data[index]
+    if choice_data is None:
+        choice_data = choices_data[index] = {
+            # 片段直接写入文本缓冲区，不保留片段列表（超长输出时显著减少内存占用）
+            'content_buf': io.StringIO(),           # 普通内容
+            'reasoning_content_buf': io.StringIO()  # 推理内容
+        }
+
+    # 累积内容片段（DeepSeek等模型通过reasoning_content属性提供推理过程）
+    reasoning_content = getattr(delta, 'reasoning_content', None)
+    if reasoning_content:
+        choice_data['reasoning_content_buf'].write(reasoning_content)
+    content = delta.content
+    if content:
+        choice_data['content_buf'].write(content)
+
+    # 收集元数据（仅在有新值时写入，保留最新值；这些字段多数chunk中为None）
+    if delta.role:
+        choice_data['role'] = delta.role
+    if delta.function_call:
+        choice_data['function_call'] = delta.function_call
+    if delta.tool_calls:
+        choice_data['tool_calls'] = delta.tool_calls
+    if choice.finish_reason:
+        choice_data['finish_reason'] = choice.finish_reason
+
+    return reasoning_content, content
+
+
+def _build_completion(completion_data: Dict[str, Any]) -> ChatCompletion:
+    """
+    由累积的响应数据构造完整的ChatCompletion
 
-    for chunk in chunks:
-        # 从第一个chunk获取基础信息
-        if id is None:
-            id = chunk.id
-            created = chunk.created
-            model = chunk.model
-            system_fingerprint = chunk.system_fingerprint
-
-        if chunk.choices:
-            for choice in chunk.choices:
-                index = choice.index
-                delta = choice.delta
-
-                # 初始化choice数据结构
-                if index not in choices_data:
-                    choices_data[index] = {
-                        'content_parts': [],           # 普通内容片段
-                        'reasoning_content_parts': []  # 推理内容片段
-                    }
-                choice_data = choices_data[index]
-
-                # 累积内容片段
-                if delta.content:
-                    choice_data['content_parts'].append(delta.content)
-                if _chatcompletionchunk_delta_has_reasoning(delta):
-                    choice_data['reasoning_content_parts'].append(delta.reasoning_content)
-
-                # 收集元数据（每次更新，保留最新值）
-                choice_data['role'] = delta.role or choice_data.get('role')
-                choice_data['function_call'] = delta.function_call or choice_data.get('function_call')
-                choice_data['tool_calls'] = delta.tool_calls or choice_data.get('tool_calls')
-                choice_data['finish_reason'] = choice.finish_reason or choice_data.get('finish_reason')
-
-        # 获取usage信息（仅在最后一个chunk中）
-        if chunk.usage:
-            usage = chunk.usage
+    参数:
+        completion_data: 累积的响应数据
 
+    返回:
+        完整的ChatCompletion对象
+    """
     # 构建所有choice对象
     choices = []
-    for index in sorted(choices_data.keys()):
-        choice_data = choices_data[index]
+    for index, choice_data in enumerate(completion_data['choices']):
+        if choice_data is None:
+            continue
 
         # 构建消息对象
         message = dict(
-            content=''.join(choice_data['content_parts']),        # 合并所有内容片段
+            content=choice_data['content_buf'].getvalue(),        # 全部内容
             role=choice_data.get('role') or 'assistant',
             function_call=choice_data.get('function_call'),
             tool_calls=choice_data.get('tool_calls')
         )
 
         # 添加推理内容（如果有）
-        if choice_data['reasoning_content_parts']:
-            full_reasoning_content = ''.join(choice_data['reasoning_content_parts'])
+        full_reasoning_content = choice_data['reasoning_content_buf'].getvalue()
+        if full_reasoning_content:
             message['reasoning_content'] = full_reasoning_content
 
-        message = ChatCompletionMessage(**message)
+        message = _CCM(**message)
 
         # 构建Choice对象
-        choice = Choice.model_construct(
+        choice = _CH(
             finish_reason=choice_data.get('finish_reason'),
             index=index,
             message=message,
@@ -129,37 +144,66 @@ def chunks_to_complete_response(chunks: List[ChatCompletionChunk]) -> ChatComple
         )
         choices.append(choice)
 
-    # 创建完整的ChatCompletion对象
-    chat_completion = ChatCompletion(
-        id=id,
+    # 创建完整的ChatCompletion对象（字段均取自已解析的chunk，用model_construct跳过校验）
+    chat_completion = _CC(
+        id=completion_data['id'],
         choices=choices,
-        created=created,
-        model=model,
+        created=completion_data['created'],
+        model=completion_data['model'],
         object='chat.completion',
-        system_fingerprint=system_fingerprint,
-        usage=usage
+        system_fingerprint=completion_data['system_fingerprint'],
+        usage=completion_data['usage']
     )
 
     return chat_completion
 
 
-@dataclass
+def chunks_to_complete_response(chunks: List[ChatCompletionChunk]) -> ChatCompletion:
+    """
+    将流式chunk列表转换为完整的ChatCompletion响应
+
+    遍历所有chunk，累积内容、推理内容和元数据，
+    最终构造完整的ChatCompletion对象。
+    StreamAccumulator 在 add_chunk 中增量完成同样的累积，此函数用于已有完整chunk列表的场景。
+
+    参数:
+        chunks: ChatCompletionChunk对象列表
+
+    返回:
+        完整的ChatCompletion对象
+
+    处理逻辑:
+        1. 从首个chunk提取基础信息（id、model等）
+        2. 按choice.index分组累积内容
+        3. 合并所有delta.content和delta.reasoning_content
+        4. 从最后一个chunk获取usage信息
+    """
+    completion_data = _new_completion_data()
+    for chunk in chunks:
+        _absorb_chunk_info(completion_data, chunk)
+        for choice in chunk.choices or ():
+            _absorb_choice(completion_data['choices'], choice)
+    return _build_completion(completion_data)
+
+
+@dataclass(slots=True)
 class StreamAccumulator(RealTimeDisplayHandler):
     """
     OpenAI流式响应累加器
 
-    累积流式ChatCompletionChunk并提供转换为完整ChatCompletion的功能。
+    在 add_chunk 中增量累积流式ChatCompletionChunk，chunk吸收后即丢弃，
+    不保留chunk列表，结束时无需重新扫描。
     继承RealTimeDisplayHandler以支持实时显示。
 
     属性:
-        chunks: 累积的ChatCompletionChunk列表
+        _completion_data: 累积的响应数据（基础信息、按index分组的内容片段、usage）
 
     方法:
         add_chunk: 添加新的chunk并处理回调/显示
-        to_complete_response: 将累积的chunks转换为完整响应
+        to_complete_response: 将累积的数据转换为完整响应
     """
 
-    chunks: List[ChatCompletionChunk] = field(default_factory=list)
+    _completion_data: Dict[str, Any] = field(default_factory=_new_completion_data)
 
     def add_chunk(
         self,
@@ -181,15 +225,15 @@ class StreamAccumulator(RealTimeDisplayHandler):
         to_complete_response()
 
         【内部调用】
-        1. self.chunks.append(chunk)
-           - 累积 chunk 到列表
+        1. _absorb_chunk_info(self._completion_data, chunk)
+           - 累积基础信息和 usage
 
-        2. 对所有 choice 执行回调（如果提供）:
+        2. 同一次遍历 choices 完成累积、回调和显示:
            for choice in chunk.choices:
+               ├─ _absorb_choice(...): 累积内容片段和元数据
                ├─ callback(delta.reasoning_content, is_thinking=True, index)
-               └─ callback(delta.content, is_thinking=False, index)
-
-        3. 实时显示第一个 choice:
+               ├─ callback(delta.content, is_thinking=False, index)
+               └─ index == 0 时实时显示:
            self._handle_realtime_display(text, is_thinking, show_thinking)
                ├─ 首次思考: 打印 "🤔 思考过程:" + 分隔符
                ├─ 首次回答: 打印 "💡 回答:"
@@ -209,41 +253,40 @@ class StreamAccumulator(RealTimeDisplayHandler):
         show_thinking: 是否显示思考内容（仅当 realtime_display=True 时有效）
 
         【返回】
-        None（副作用：修改 self.chunks，执行回调和打印）
+        None（副作用：修改 self._completion_data，执行回调和打印）
 
         【OpenAI 特点】
         - Delta 增量模式：每个 chunk 只包含新增内容
         - 推理内容通过 reasoning_content 属性暴露（DeepSeek）
         - 多 choice 支持：遍历所有 choice 执行回调
         """
-        self.chunks.append(chunk)
+        _absorb_chunk_info(self._completion_data, chunk)
         if not chunk.choices:
             return
 
-        # 处理所有choice的回调
+        # 累积、回调和实时显示在同一次遍历中完成
+        choices_data = self._completion_data['choices']
         for choice in chunk.choices:
+            reasoning_content, content = _absorb_choice(choices_data, choice)
             index = choice.index
-            delta = choice.delta
 
             if callback:
-                # 回调推理内容
-                if _chatcompletionchunk_delta_has_reasoning(delta):
-                    callback(delta.reasoning_content, True, index)
-                # 回调普通内容
-                if delta.content:
-                    callback(delta.content, False, index)
-
-        # 实时显示第一个choice
-        if realtime_display:
-            delta = chunk.choices[0].delta
-            if _chatcompletionchunk_delta_has_reasoning(delta):
-                self._handle_realtime_display(delta.reasoning_content, True, show_thinking)
-            if delta.content:
-                self._handle_realtime_display(delta.content, False, False)
+                # 回调推理内容和普通内容
+                if reasoning_content:
+                    callback(reasoning_content, True, index)
+                if content:
+                    callback(content, False, index)
+
+            # 实时显示第一个choice
+            if realtime_display and index == 0:
+                if reasoning_content:
+                    self._handle_realtime_display(reasoning_content, True, show_thinking)
+                if content:
+                    self._handle_realtime_display(content, False, False)
 
     def to_complete_response(self) -> ChatCompletion:
         """
-        将累积的 chunks 转换为完整的 ChatCompletion 对象
+        将增量累积的数据转换为完整的 ChatCompletion 对象
 
         【调用链】
         _handle_sync()
@@ -256,16 +299,17 @@ class StreamAccumulator(RealTimeDisplayHandler):
         返回 ChatCompletion
 
         【内部调用】
-        chunks_to_complete_response(self.chunks)
+        _build_completion(self._completion_data)
             ↓
-        处理逻辑:
+        累积逻辑（已在 add_chunk 中逐个chunk完成）:
             1. 从首个 chunk 提取: id, created, model, system_fingerprint
             2. 按 choice.index 分组累积:
-               ├─ content_parts.append(delta.content)
-               └─ reasoning_content_parts.append(delta.reasoning_content)
-            3. 合并内容片段:
-               ├─ content = ''.join(content_parts)
-               └─ reasoning_content = ''.join(reasoning_content_parts)
+               ├─ content_buf.write(delta.content)
+               └─ reasoning_content_buf.write(delta.reasoning_content)
+        处理逻辑:
+            3. 取出完整内容:
+               ├─ content = content_buf.getvalue()
+               └─ reasoning_content = reasoning_content_buf.getvalue()
             4. 从最后 chunk 提取: usage
             5. 构造 ChatCompletion 对象
 
@@ -284,4 +328,25 @@ class StreamAccumulator(RealTimeDisplayHandler):
         - 支持多 choice：按 index 分组处理
         - usage 信息：仅在最后一个 chunk 中存在
         """
-        return chunks_to_complete_response(self.chunks)
+        self.flush()
+        return _build_completion(self._completion_data)
+
+    def to_text(self, index: int = 0) -> Tuple[str, str]:
+        """
+        只返回累积的文本，不构造 ChatCompletion
+
+        只需要最终文本时（如自行驱动累加器、按回调收集结果），
+        可跳过 pydantic 模型的构造。
+
+        参数:
+            index: choice 的索引，默认 0
+
+        返回:
+            (content, reasoning_content)，不存在的 choice 返回 ('', '')
+        """
+        self.flush()
+        choices_data = self._completion_data['choices']
+        choice_data = choices_data[index] if index < len(choices_data) else None
+        if choice_data is None:
+            return '', ''
+        return choice_data['content_buf'].getvalue(), choice_data['reasoning_content_buf'].getvalue()
@@ -1,27 +1,88 @@
 """
-流式响应实时显示处理工具
+流式响应通用工具
 
-提供实时显示处理器，用于格式化输出思考过程和最终回答。
+提供实时显示处理器，用于格式化输出思考过程和最终回答；
+以及流式解析热路径和httpx请求使用的JSON编解码函数。
 """
 
-from dataclasses import dataclass
+import json
+from dataclasses import dataclass, field
+from typing import List
 
 
-@dataclass
+def _stdlib_json_dumps(obj) -> bytes:
+    """标准库JSON编码（紧凑格式，UTF-8 bytes）"""
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# 优先使用orjson解码（小JSON负载上比标准库快2-3倍），未安装时回退到标准库
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方统一捕获后者即可
+# json_dumps 返回UTF-8编码的bytes（orjson原生输出bytes，无需再encode），可直接作为httpx请求体
+try:
+    import orjson
+    json_loads = orjson.loads
+
+    def json_dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson不支持非str字典键和超过64位的整数，这类请求体回退到标准库编码
+            # （orjson.JSONEncodeError 是 TypeError 的子类）
+            return _stdlib_json_dumps(obj)
+except ImportError:
+    json_loads = json.loads
+    json_dumps = _stdlib_json_dumps
+
+
+@dataclass(slots=True)
 class RealTimeDisplayHandler:
     """
     实时显示处理器
 
     跟踪思考过程和回答的显示状态，添加格式化的标题和分隔符。
+    文本先写入缓冲区，累积到一定长度或遇到换行时才写出，
+    以减少同一批网络数据中逐token的终端写入和flush次数。
 
     属性:
         first_thoughts_shown: 是否已显示思考过程标题
         first_answer_shown: 是否已显示回答标题
+        _display_buf: 待输出的文本片段
+        _display_size: 缓冲区中的字符数
+
+    注意:
+        调用方在处理完每批网络数据（一个SDK chunk，或一次网络读取切分出的全部SSE事件）后
+        需调用 flush()，否则流暂停（如长时间推理、工具调用）期间已缓冲的文本不会显示；
+        流结束时 to_complete_response() 会自动调用 flush()
     """
 
+    # 缓冲区达到该字符数时输出：一次网络读取通常只含几十到几百字符，
+    # 1024足以把同一批的多个片段合并为一次写入，又能让一批内容很多时分段显示
+    _DISPLAY_FLUSH = 1024
+
     # 实时显示状态变量
     first_thoughts_shown: bool = False
     first_answer_shown: bool = False
+    _display_buf: List[str] = field(default_factory=list)
+    _display_size: int = 0
+
+    def _write(self, text: str) -> None:
+        """
+        写入待显示文本，满足条件时输出缓冲区
+
+        参数:
+            text: 要显示的文本内容
+        """
+        self._display_buf.append(text)
+        self._display_size += len(text)
+        if self._display_size >= self._DISPLAY_FLUSH or '\n' in text:
+            self.flush()
+
+    def flush(self) -> None:
+        """输出缓冲区中的全部文本"""
+        if self._display_buf:
+            print(''.join(self._display_buf), end='', flush=True)
+            self._display_buf.clear()
+            self._display_size = 0
 
     def _handle_realtime_display(self, text: str, is_thinking: bool, show_thinking: bool) -> None:
         """
@@ -41,21 +102,24 @@ class RealTimeDisplayHandler:
         if is_thinking and show_thinking:
             # 首次显示思考内容时，添加标题和分隔符
             if not self.first_thoughts_shown:
+                self.flush()
                 print("\n🤔 思考过程:")
                 print("-" * 50)
                 self.first_thoughts_shown = True
-            print(text, end='', flush=True)
+            self._write(text)
         elif not is_thinking:
             # 首次显示回答内容时，添加标题
             if not self.first_answer_shown and self.first_thoughts_shown:
                 # 如果之前显示了思考过程，添加分隔符
+                self.flush()
                 print("\n" + "=" * 50)
                 print("💡 回答:")
                 self.first_answer_shown = True
             elif not self.first_answer_shown:
                 # 如果没有思考过程，直接显示回答标题
+                self.flush()
                 print("💡 回答:")
                 self.first_answer_shown = True
-            print(text, end='', flush=True)
+            self._write(text)
 
 
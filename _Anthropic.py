@@ -19,16 +19,20 @@ from ._BaseChatBot import *
 
 __all__ = ['AnthropicSDKChatBot']
 
+# Anthropic 消息只接受的标准字段
+_MESSAGE_KEYS = frozenset(('role', 'content'))
 
-def _message_to_unified_format(response: Message) -> Dict[str, Any]:
+
+def _message_to_unified_format(response: Message, include_raw: bool = True) -> ResponseDict:
     """
     将 Anthropic Message 转换为统一格式
 
     参数:
         response: Anthropic Message 对象
+        include_raw: 是否生成 _raw_dict，默认True
 
     返回:
-        统一格式字典，参考 BaseChatBot._to_unified_format 文档
+        统一格式的ResponseDict，参考 BaseChatBot._to_unified_format 文档
     """
     if not response.content:
         return _create_empty_unified_response(
@@ -37,21 +41,25 @@ def _message_to_unified_format(response: Message) -> Dict[str, Any]:
         )
 
     # 提取文本内容和思考内容
-    content_text = ''
-    thinking_text = ''
+    content_parts = []
+    thinking_parts = []
 
     for block in response.content:
-        if block.type == 'text':
-            content_text += block.text
-        elif block.type == 'thinking':
-            thinking_text += block.thinking
+        block_type = block.type
+        if block_type == 'text':
+            content_parts.append(block.text)
+        elif block_type == 'thinking':
+            thinking_parts.append(block.thinking)
+
+    content_text = ''.join(content_parts)
+    thinking_text = ''.join(thinking_parts)
 
-    result = {
+    result = ResponseDict({
         'role': 'assistant',
         'content': content_text,
         '_model': str(response.model),
         '_finish_reason': str(response.stop_reason) if response.stop_reason else 'unknown'
-    }
+    })
 
     # 添加思考内容
     if thinking_text:
@@ -69,8 +77,9 @@ def _message_to_unified_format(response: Message) -> Dict[str, Any]:
     else:
         result['_usage'] = {}
 
-    # 添加完整原始数据
-    result['_raw_dict'] = response.model_dump(exclude_none=True)
+    # 添加完整原始数据（include_raw=False 时省去 model_dump 的完整遍历）
+    if include_raw:
+        result['_raw_dict'] = response.model_dump(exclude_none=True)
 
     return result
 
@@ -105,6 +114,8 @@ class AnthropicSDKChatBot(BaseSDKChatBot):
         ... )
     """
 
+    __slots__ = ('thinking_budget',)
+
     def __init__(
         self,
         api_key: str,
@@ -151,6 +162,10 @@ class AnthropicSDKChatBot(BaseSDKChatBot):
 
         cleaned = []
         for msg in messages:
+            if msg.keys() == _MESSAGE_KEYS:
+                # 已只含标准字段，直接复用原字典
+                cleaned.append(msg)
+                continue
             # 只保留标准字段：role 和 content
             result = {
                 'role': msg['role'],
@@ -160,9 +175,9 @@ class AnthropicSDKChatBot(BaseSDKChatBot):
 
         return cleaned
 
-    def _to_unified_format(self, raw_response: Message) -> Dict[str, Any]:
+    def _to_unified_format(self, raw_response: Message, include_raw: bool = True) -> ResponseDict:
         """将 Anthropic Message 转换为统一格式"""
-        return _message_to_unified_format(raw_response)
+        return _message_to_unified_format(raw_response, include_raw)
 
     def _handle_complete_response(
         self,
@@ -184,19 +199,23 @@ class AnthropicSDKChatBot(BaseSDKChatBot):
         if not inputs or not inputs.content:
             return inputs
 
+        # 按内容块顺序收集待显示文本，最后一次性输出
+        display_parts = []
         for content_block in inputs.content:
             if content_block.type == 'thinking':
                 # 处理思考内容
                 if callback:
                     callback(content_block.thinking, True, 0)
                 if self.realtime_display and self.show_thinking:
-                    print(content_block.thinking, flush=True)
+                    display_parts.append(content_block.thinking)
             elif content_block.type == 'text':
                 # 处理普通文本
                 if callback:
                     callback(content_block.text, False, 0)
                 if self.realtime_display:
-                    print(content_block.text, flush=True)
+                    display_parts.append(content_block.text)
+        if display_parts:
+            print('\n'.join(display_parts), flush=True)
 
         return inputs
 
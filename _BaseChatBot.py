@@ -5,16 +5,18 @@
 提供了统一的对话接口，支持同步/异步、流式/完整响应等多种模式。
 """
 
-import asyncio
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from google.genai.types import GenerateContentResponse
 from anthropic.types import Message, RawMessageStreamEvent
 from typing import Iterator, AsyncIterator, Optional, Callable, Union, Coroutine, Awaitable, List, Dict, Any
-from .Client import ApiSDKClient
+from .Client import _acquire_sdk_client, _release_client
 from .response_dict import ResponseDict,_create_empty_unified_response
 
 __all__ = ['BaseChatBot', 'BaseSDKChatBot', '_create_empty_unified_response', 'ResponseDict']
 
+# 各SDK完整（非流式）响应类型
+_COMPLETE_RESPONSE_TYPES = (ChatCompletion, GenerateContentResponse, Message)
+
 class BaseChatBot:
     """
     聊天机器人抽象基类
@@ -31,6 +33,8 @@ class BaseChatBot:
         子类必须实现所有抽象方法。
     """
 
+    __slots__ = ('realtime_display', 'show_thinking', '__weakref__')
+
     def __init__(self, realtime_display: bool = True, show_thinking: bool = True):
         """
         初始化聊天机器人基类
@@ -38,7 +42,11 @@ class BaseChatBot:
         self.realtime_display = realtime_display
         self.show_thinking = show_thinking
 
-    def _to_unified_format(self, raw_response: Union[ChatCompletion, GenerateContentResponse, Message]) -> Dict[str, Any]:
+    def _to_unified_format(
+        self,
+        raw_response: Union[ChatCompletion, GenerateContentResponse, Message],
+        include_raw: bool = True
+    ) -> ResponseDict:
         """
         将原始SDK响应转换为统一格式（抽象方法）
 
@@ -54,7 +62,7 @@ class BaseChatBot:
             },
             '_model': 'gpt-4o',           # 使用的模型名
             '_finish_reason': 'stop',     # 停止原因
-            '_raw_dict': {...}            # 完整的原始SDK响应（通过model_dump获取）
+            '_raw_dict': {...}            # 完整的原始SDK响应（通过model_dump获取，include_raw=False时省略）
         }
 
         注意：
@@ -65,9 +73,10 @@ class BaseChatBot:
 
         参数:
             raw_response: 原始SDK响应对象
+            include_raw: 是否生成 _raw_dict，默认True
 
         返回:
-            统一格式的字典
+            统一格式的ResponseDict（子类直接构造，Chat/AsyncChat 不再二次包装）
 
         异常:
             NotImplementedError: 子类必须实现此方法
@@ -159,6 +168,8 @@ class BaseChatBot:
         system_instruction: Optional[str] = None,
         callback: Optional[Callable[[str, bool, int], None]] = None,
         raw_response: bool = False,
+        skip_normalize: bool = False,
+        include_raw: bool = True,
         **kwargs
     ):
         """
@@ -182,7 +193,7 @@ class BaseChatBot:
         返回统一格式字典或原始SDK对象
 
         【内部调用】
-        1. messages = self._normalize_messages(messages)
+        1. messages = self._normalize_messages(messages)（skip_normalize=True 时跳过）
            - 将标准格式转换为提供商所需格式
            - OpenAI: 无需转换，直接返回
            - Google/Anthropic: 重写，格式转换（Google only）及过滤元数据字段（以_开头的字段）
@@ -196,7 +207,7 @@ class BaseChatBot:
            - 流式: 使用 StreamAccumulator 逐块累加
            - 完整: 调用 _handle_complete_response
 
-        4. return raw if raw_response else self._to_unified_format(raw)
+        4. return raw if raw_response else self._to_unified_format(raw, include_raw)
            - raw_response=False: 转换为统一格式字典
            - raw_response=True: 返回原始SDK对象
 
@@ -211,12 +222,17 @@ class BaseChatBot:
         raw_response: 是否返回原始SDK响应对象，默认 False
                      False: 返回统一格式（详见 _to_unified_format）
                      True: 返回原始SDK对象
+        skip_normalize: 是否跳过 _normalize_messages()，默认 False
+                     messages 已是当前提供商格式且不含元数据字段时可设为 True，
+                     省去对整个历史的一次遍历（如长对话中自行维护Google parts格式的历史）
+        include_raw: 是否在统一格式中生成 _raw_dict，默认 True
+                     只使用 content/_usage 等字段时可设为 False，省去 model_dump 对整个响应的遍历
         **kwargs: 其他 API 参数（temperature, max_tokens 等）
 
         【返回】
         默认: 统一格式字典（详见 _to_unified_format 文档）
               包含核心字段(role, content)、标准元数据(_thinking, _usage, _model, _finish_reason)
-              和完整原始数据(_raw_dict)
+              和完整原始数据(_raw_dict，include_raw=False 时省略)
         raw_response=True: 原始SDK对象（ChatCompletion/GenerateContentResponse/Message）
 
         【示例】
@@ -229,14 +245,11 @@ class BaseChatBot:
         【参考】
         详细架构: ApiChatBot/ARCHITECTURE.md
         """
-        messages = self._normalize_messages(messages)
+        if not skip_normalize:
+            messages = self._normalize_messages(messages)
         response = self.send_request(model, messages, stream, system_instruction, **kwargs)
         raw = self._handle_sync(response, callback)
-        if raw_response:
-            return raw
-        else:
-            unified = self._to_unified_format(raw)
-            return unified if isinstance(unified, ResponseDict) else ResponseDict(unified)
+        return raw if raw_response else self._to_unified_format(raw, include_raw)
 
     async def AsyncChat(
         self,
@@ -246,6 +259,8 @@ class BaseChatBot:
         system_instruction: Optional[str] = None,
         callback: Optional[Callable[[str, bool, int], None]] = None,
         raw_response: bool = False,
+        skip_normalize: bool = False,
+        include_raw: bool = True,
         **kwargs
     ):
         """
@@ -269,7 +284,7 @@ class BaseChatBot:
         返回统一格式字典或原始SDK对象
 
         【内部调用】
-        1. messages = self._normalize_messages(messages)
+        1. messages = self._normalize_messages(messages)（skip_normalize=True 时跳过）
            - 将标准格式转换为提供商所需格式（同步版本）
 
         2. response = self.send_request(model, messages, stream, system_instruction, **kwargs)
@@ -281,7 +296,7 @@ class BaseChatBot:
            - 流式: async for chunk 逐块累加
            - 完整: await response 后处理
 
-        4. return raw if raw_response else self._to_unified_format(raw)
+        4. return raw if raw_response else self._to_unified_format(raw, include_raw)
            - 根据 raw_response 参数决定返回格式
 
         【参数】
@@ -293,6 +308,8 @@ class BaseChatBot:
         system_instruction: 系统指令（可选）
         callback: 自定义回调函数
         raw_response: 是否返回原始SDK响应对象，默认 False
+        skip_normalize: 是否跳过 _normalize_messages()，默认 False（详见 Chat 方法）
+        include_raw: 是否生成 _raw_dict，默认 True（详见 Chat 方法）
         **kwargs: 其他 API 参数
 
         【返回】
@@ -308,22 +325,22 @@ class BaseChatBot:
         【注意】
         必须在异步环境中使用，初始化时需设置 is_async=True
         """
-        messages = self._normalize_messages(messages)
+        if not skip_normalize:
+            messages = self._normalize_messages(messages)
         response = self.send_request(model, messages, stream, system_instruction, **kwargs)
         raw = await self._handle_async(response, callback)
-        if raw_response:
-            return raw
-        else:
-            unified = self._to_unified_format(raw)
-            return unified if isinstance(unified, ResponseDict) else ResponseDict(unified)
+        return raw if raw_response else self._to_unified_format(raw, include_raw)
 
     def close(self):
         """
         关闭同步客户端会话，释放资源
 
         应在不再使用聊天机器人时调用，以释放网络连接等资源。
+        共享连接池仍被其他聊天机器人使用时只释放本实例的占用，由最后一个使用者关闭。
         """
-        self.client.close()
+        lease, self._lease = self._lease, None
+        if _release_client(lease):
+            self.client.close()
 
     async def aclose(self):
         """
@@ -331,7 +348,9 @@ class BaseChatBot:
 
         异步版本的close方法，应在异步环境中使用。
         """
-        await self.client.close()
+        lease, self._lease = self._lease, None
+        if _release_client(lease):
+            await self.client.close()
 
     def __enter__(self):
         """
@@ -388,6 +407,9 @@ class BaseSDKChatBot(BaseChatBot):
         - sa_factory(): 创建对应提供商的StreamAccumulator实例
         - _handle_complete_response(): 处理完整响应的显示和回调
     """
+
+    __slots__ = ('api_key', 'base_url', 'is_async', 'is_ssl_verify', 'client', '_lease')
+
     def __init__(
         self,
         api_key: str,
@@ -414,13 +436,19 @@ class BaseSDKChatBot(BaseChatBot):
         self.is_async = is_async
         self.is_ssl_verify = is_ssl_verify
         self.client = None
+        self._lease = None
         self.reset_client() # 初始化 client
 
     @property
     def interfacetype(self):
         raise NotImplementedError
     def reset_client(self):
-        self.client = ApiSDKClient(
+        # 先释放旧客户端的占用：同步客户端为最后一个使用者时关闭；
+        # 异步客户端无法在同步方法中关闭，需重建前先 await aclose()
+        lease, self._lease = self._lease, None
+        if _release_client(lease) and not self.is_async:
+            self.client.close()
+        self.client, self._lease = _acquire_sdk_client(
             self.api_key, self.base_url,
             interfacetype=self.interfacetype,
             is_async=self.is_async,
@@ -537,16 +565,24 @@ class BaseSDKChatBot(BaseChatBot):
         if isinstance(inputs, Iterator):
             # 流式响应处理
             sa = self.sa_factory()
-            for chunk in inputs:
-                sa.add_chunk(chunk, callback, self.realtime_display, self.show_thinking)
-            if self.realtime_display:
-                print('\n')  # 流式输出完成后换行
-            return sa.to_complete_response()
+            # 循环内使用局部变量，避免每个chunk重复查找属性
+            add_chunk = sa.add_chunk
+            flush = sa.flush
+            realtime_display = self.realtime_display
+            show_thinking = self.show_thinking
+            try:
+                for chunk in inputs:
+                    add_chunk(chunk, callback, realtime_display, show_thinking)
+                    flush()  # 每个chunk处理完即输出，流暂停期间不滞留已缓冲的文本
+            finally:
+                sa.flush()  # 流中途出错时也输出已缓冲的显示内容
+            response = sa.to_complete_response()  # 同时输出显示缓冲区中的剩余内容
+            if realtime_display:
+                print(end='\n\n', flush=True)  # 流式输出完成后换行（单次写入并刷新）
+            return response
         else:
             # 完整响应处理
-            assert isinstance(inputs, ChatCompletion) or \
-                isinstance(inputs, GenerateContentResponse) or \
-                isinstance(inputs, Message)
+            assert isinstance(inputs, _COMPLETE_RESPONSE_TYPES)
             return self._handle_complete_response(inputs, callback)
 
     async def _handle_async(
@@ -575,36 +611,28 @@ class BaseSDKChatBot(BaseChatBot):
         【类型判断与 await】
         isinstance(inputs, AsyncIterator)?
         ↓                               ↓
-       YES (流式)                      NO (完整)
-  resolved_inputs = inputs        resolved_inputs = await inputs
-        ↓                               ↓
-  isinstance(resolved_inputs, AsyncIterator)?
-        ↓                               ↓
-  【异步流式响应】                     【完整响应】
-  sa = sa_factory()                _handle_sync(resolved_inputs)
+       YES (流式)                      NO
+        ↓                      resolved_inputs = await inputs
         ↓                               ↓
-  async for chunk in resolved_inputs:   复用同步逻辑
-    sa.add_chunk()                        ↓
-        ↓                           返回响应对象
-  sa.to_complete_response()
-        ↓
+        ↓             isinstance(resolved_inputs, AsyncIterator)?
+        ↓                  ↓ YES (Google流式)      ↓ NO (完整)
+  【异步流式响应】 ←────────┘               【完整响应】
+  _consume_async_stream()                _handle_sync(resolved_inputs)
+    sa = sa_factory()                          ↓
+    async for chunk: sa.add_chunk()       复用同步逻辑
+    sa.to_complete_response()                  ↓
+        ↓                                 返回响应对象
   返回完整响应对象
         ↓
     → _to_unified_format() (在 AsyncChat() 中)
 
         【内部调用】
-        1. 类型判断和 await:
-           - isinstance(inputs, AsyncIterator): 流式，直接使用
-           - else: 完整响应，await inputs 等待协程
-
-        2. 流式分支（resolved_inputs 是 AsyncIterator）:
-           a. sa = self.sa_factory()
-           b. async for chunk in resolved_inputs:
-                sa.add_chunk(chunk, callback, ...)
-           c. return sa.to_complete_response()
+        1. inputs 是 AsyncIterator（OpenAI / Anthropic 流式）:
+           - 直接 self._consume_async_stream(inputs, callback)，无需第二次类型判断
 
-        3. 完整分支（resolved_inputs 不是 AsyncIterator）:
-           - 复用同步逻辑: self._handle_sync(resolved_inputs, callback)
+        2. 否则 await inputs 等待协程:
+           - 结果是 AsyncIterator（Google 流式）: self._consume_async_stream(...)
+           - 结果是完整响应: 复用同步逻辑 self._handle_sync(resolved_inputs, callback)
 
         【被调用】
         - BaseChatBot.AsyncChat() - 异步对话入口
@@ -627,33 +655,43 @@ class BaseSDKChatBot(BaseChatBot):
         - 流式: 直接返回 AsyncIterator，无需 await
         - 完整: 返回协程 (Awaitable)，必须 await
         """
-        # 区分 await 前后的类型，使用不同变量
-        # resolved_inputs: await 后的实际类型
+        if isinstance(inputs, AsyncIterator):
+            # 流式响应，直接消费（OpenAI / Anthropic）
+            return await self._consume_async_stream(inputs, callback)
+
+        # 否则需要 await：完整响应，或 Google 异步流式（协程返回 AsyncIterator）
         resolved_inputs: Union[
-            AsyncIterator[ChatCompletionChunk],
             AsyncIterator[GenerateContentResponse],
-            AsyncIterator[RawMessageStreamEvent],
             ChatCompletion,
             GenerateContentResponse,
             Message
-        ]
-
-        if isinstance(inputs, AsyncIterator):
-            # 流式响应，直接使用
-            resolved_inputs = inputs
-        else:
-            # 完整响应，需要 await
-            resolved_inputs = await inputs
+        ] = await inputs
 
         if isinstance(resolved_inputs, AsyncIterator):
-            # 异步流式响应处理
-            sa = self.sa_factory()
-            async for chunk in resolved_inputs:
-                sa.add_chunk(chunk, callback, self.realtime_display, self.show_thinking)
-            if self.realtime_display:
-                print('\n')  # 流式输出完成后换行
-            return sa.to_complete_response()
-        else:
-            # 完整响应处理（复用同步逻辑）
-            return self._handle_sync(resolved_inputs, callback)
+            return await self._consume_async_stream(resolved_inputs, callback)
+        # 完整响应处理（复用同步逻辑）
+        return self._handle_sync(resolved_inputs, callback)
+
+    async def _consume_async_stream(
+        self,
+        stream: AsyncIterator[Any],
+        callback: Optional[Callable[[str, bool, int], None]] = None
+    ):
+        """异步流式响应处理：逐块累加并返回完整响应对象"""
+        sa = self.sa_factory()
+        # 循环内使用局部变量，避免每个chunk重复查找属性
+        add_chunk = sa.add_chunk
+        flush = sa.flush
+        realtime_display = self.realtime_display
+        show_thinking = self.show_thinking
+        try:
+            async for chunk in stream:
+                add_chunk(chunk, callback, realtime_display, show_thinking)
+                flush()  # 每个chunk处理完即输出，流暂停期间不滞留已缓冲的文本
+        finally:
+            sa.flush()  # 流中途出错时也输出已缓冲的显示内容
+        response = sa.to_complete_response()  # 同时输出显示缓冲区中的剩余内容
+        if realtime_display:
+            print(end='\n\n', flush=True)  # 流式输出完成后换行（单次写入并刷新）
+        return response
 
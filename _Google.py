@@ -19,68 +19,99 @@ from google.genai.types import GenerateContentResponse
 from typing import Iterator, AsyncIterator, Optional, Callable, Union, Coroutine, List, Dict, Any
 
 from . import StreamUtils
+from .Client import _release_client
 from ._BaseChatBot import *
 
 __all__ = ['GoogleSDKChatBot']
 
+# Google 格式消息的标准字段
+_GOOGLE_MESSAGE_KEYS = frozenset(('role', 'parts'))
 
-def _generatecontent_response_to_unified_format(response: GenerateContentResponse) -> Dict[str, Any]:
+
+def _generatecontent_response_to_unified_format(response: GenerateContentResponse, include_raw: bool = True) -> ResponseDict:
     """
     将 GenerateContentResponse 转换为统一格式
 
     参数:
         response: Google GenerateContentResponse 对象
+        include_raw: 是否生成 _raw_dict，默认True
 
     返回:
-        统一格式字典，参考 BaseChatBot._to_unified_format 文档
+        统一格式的ResponseDict，参考 BaseChatBot._to_unified_format 文档
     """
-    if not response.candidates:
-        return _create_empty_unified_response(
-            role='model',
-            model=response.model_version or 'unknown'
-        )
+    model_version = response.model_version or 'unknown'
+    candidates = response.candidates
+    if not candidates:
+        return _create_empty_unified_response(role='model', model=model_version)
 
-    candidate = response.candidates[0]
+    candidate = candidates[0]
 
     # 提取文本内容和思考内容
-    content_text = ''
-    thinking_text = ''
-
-    if candidate.content and candidate.content.parts:
-        for part in candidate.content.parts:
-            if part.text:
-                if part.thought:  # 思考内容
-                    thinking_text += part.text
-                else:  # 普通内容
-                    content_text += part.text
-
-    result = {
+    content_parts = []
+    thinking_parts = []
+
+    content = candidate.content
+    parts = content.parts if content else None
+    if parts:
+        for part in parts:
+            text = part.text
+            if text:
+                # 思考内容与普通内容分别收集，最后一次性拼接
+                (thinking_parts if part.thought else content_parts).append(text)
+
+    finish_reason = candidate.finish_reason
+    result = ResponseDict({
         'role': 'model',  # Google uses 'model' instead of 'assistant'
-        'content': content_text,
-        '_model': response.model_version or 'unknown',
-        '_finish_reason': str(candidate.finish_reason) if candidate.finish_reason else 'unknown'
-    }
+        'content': ''.join(content_parts),
+        '_model': model_version,
+        '_finish_reason': str(finish_reason) if finish_reason else 'unknown'
+    })
 
-    # 添加思考内容
-    if thinking_text:
-        result['_thinking'] = thinking_text
+    # 添加思考内容（只收集了非空文本，列表非空即有思考内容）
+    if thinking_parts:
+        result['_thinking'] = ''.join(thinking_parts)
 
     # 添加 usage 信息
-    if response.usage_metadata:
+    usage_metadata = response.usage_metadata
+    if usage_metadata:
         result['_usage'] = {
-            'prompt_tokens': response.usage_metadata.prompt_token_count or 0,
-            'completion_tokens': response.usage_metadata.candidates_token_count or 0,
-            'total_tokens': response.usage_metadata.total_token_count or 0
+            'prompt_tokens': usage_metadata.prompt_token_count or 0,
+            'completion_tokens': usage_metadata.candidates_token_count or 0,
+            'total_tokens': usage_metadata.total_token_count or 0
         }
     else:
         result['_usage'] = {}
 
-    # 添加完整原始数据
-    result['_raw_dict'] = response.model_dump(exclude_none=True)
+    # 添加完整原始数据（include_raw=False 时省去 model_dump 的完整遍历）
+    if include_raw:
+        result['_raw_dict'] = response.model_dump(exclude_none=True)
 
     return result
 
 
+def _convert_message(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """将单条消息转换为Google格式（已是只含标准字段的Google格式时直接复用）"""
+    if msg.keys() == _GOOGLE_MESSAGE_KEYS:
+        return msg
+    if 'parts' in msg:
+        # 已经是Google格式，过滤掉元数据字段
+        return {
+            'role': msg['role'],
+            'parts': msg['parts']
+        }
+    if 'content' in msg:
+        # 标准OpenAI格式，转换为Google格式
+        # 注意：不保留元数据字段（以_开头的字段）
+        # 这些字段是输出时的元数据，不应该作为输入传递给SDK
+        # 否则会导致Google SDK的Pydantic验证错误
+        return {
+            'role': msg['role'],
+            'parts': [{'text': msg['content']}]
+        }
+    # 其他格式，直接保留
+    return msg
+
+
 def _convert_to_google_format(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     将标准OpenAI格式消息转换为Google格式
@@ -97,36 +128,16 @@ def _convert_to_google_format(messages: List[Dict[str, Any]]) -> List[Dict[str,
     注意:
         - 支持向后兼容：如果已经是Google格式，直接返回
         - 保持幂等性：多次调用结果相同
-        - 保留元数据字段：转换时保留所有以_开头的元数据字段
+        - 不保留元数据字段：转换时过滤所有以_开头的元数据字段
     """
     if not messages:
         return messages
 
-    converted = []
-    for msg in messages:
-        # 检测是否已经是Google格式
-        if 'parts' in msg:
-            # 已经是Google格式，过滤掉元数据字段
-            result = {
-                'role': msg['role'],
-                'parts': msg['parts']
-            }
-            converted.append(result)
-        elif 'content' in msg:
-            # 标准OpenAI格式，转换为Google格式
-            result = {
-                'role': msg['role'],
-                'parts': [{'text': msg['content']}]
-            }
-            # 注意：不保留元数据字段（以_开头的字段）
-            # 这些字段是输出时的元数据，不应该作为输入传递给SDK
-            # 否则会导致Google SDK的Pydantic验证错误
-            converted.append(result)
-        else:
-            # 其他格式，直接保留
-            converted.append(msg)
+    # 全部已是只含标准字段的Google格式时，直接返回原列表
+    if all(msg.keys() == _GOOGLE_MESSAGE_KEYS for msg in messages):
+        return messages
 
-    return converted
+    return [_convert_message(msg) for msg in messages]
 
 
 class GoogleSDKChatBot(BaseSDKChatBot):
@@ -147,6 +158,8 @@ class GoogleSDKChatBot(BaseSDKChatBot):
         - thinking_budget默认-1（由模型自动决定）
     """
 
+    __slots__ = ('thinking_budget', '_default_config', '_models')
+
     def __init__(
         self,
         api_key: str,
@@ -166,18 +179,35 @@ class GoogleSDKChatBot(BaseSDKChatBot):
         """
         super().__init__(api_key, base_url, is_async, is_ssl_verify, realtime_display, show_thinking)
         self.thinking_budget = thinking_budget
+        self._default_config = self._build_default_config()
+
+    def _build_default_config(self) -> genai.types.GenerateContentConfig:
+        """构建默认请求配置模板（含thinking_config），send_request中浅拷贝复用"""
+        return genai.types.GenerateContentConfig(
+            thinking_config=genai.types.ThinkingConfig(
+                include_thoughts=True,
+                thinking_budget=self.thinking_budget
+            )
+        )
 
     @property
     def interfacetype(self):
         return 'google'
 
+    def reset_client(self):
+        """重建客户端，并缓存同步/异步对应的models接口供send_request使用"""
+        super().reset_client()
+        self._models = self.client.aio.models if self.is_async else self.client.models
+
     async def aclose(self):
         """
         关闭异步客户端会话，释放资源
 
         Google特殊实现：使用client.aio.aclose()而非client.close()
         """
-        await self.client.aio.aclose()
+        lease, self._lease = self._lease, None
+        if _release_client(lease):
+            await self.client.aio.aclose()
 
     def _normalize_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -187,9 +217,9 @@ class GoogleSDKChatBot(BaseSDKChatBot):
         """
         return _convert_to_google_format(messages)
 
-    def _to_unified_format(self, raw_response: GenerateContentResponse) -> Dict[str, Any]:
+    def _to_unified_format(self, raw_response: GenerateContentResponse, include_raw: bool = True) -> ResponseDict:
         """将 GenerateContentResponse 转换为统一格式"""
-        return _generatecontent_response_to_unified_format(raw_response)
+        return _generatecontent_response_to_unified_format(raw_response, include_raw)
 
     def sa_factory(self):
         """创建Google流式累加器"""
@@ -215,6 +245,7 @@ class GoogleSDKChatBot(BaseSDKChatBot):
         """
         sa = self.sa_factory()
         sa.add_chunk(inputs, callback, self.realtime_display, self.show_thinking)
+        sa.flush()
         if self.realtime_display:
             # 补上换行符（add_chunk结束符为空）
             print(flush=True)
@@ -252,8 +283,8 @@ class GoogleSDKChatBot(BaseSDKChatBot):
            )
 
         【内部调用】
-        1. 选择接口：
-           models = self.client.aio.models if self.is_async else self.client.models
+        1. 选择接口（reset_client() 时已缓存）：
+           models = self._models  # client.aio.models (异步) 或 client.models (同步)
 
         2. 配置思考：
            config.thinking_config = ThinkingConfig(...)
@@ -290,33 +321,33 @@ class GoogleSDKChatBot(BaseSDKChatBot):
         - 客户端: 单一客户端，通过 client.models / client.aio.models 切换
         参考: ARCHITECTURE.md - "各提供商差异对比"
         """
-        # 根据is_async选择同步或异步models
-        models = self.client.aio.models if self.is_async else self.client.models
+        # 同步或异步models（reset_client时已按is_async选定）
+        models = self._models
         generate_func = models.generate_content_stream if stream else models.generate_content
 
-        # 处理配置对象
-        if 'config' not in kwargs:
-            config = genai.types.GenerateContentConfig()
+        # 处理配置对象（**kwargs本身即为新字典，直接pop不影响调用方）
+        config = kwargs.pop('config', None)
+        if config is None:
+            # 复用初始化时构建的模板（thinking_budget被修改后重建），浅拷贝后只改system_instruction
+            if self._default_config.thinking_config.thinking_budget != self.thinking_budget:
+                self._default_config = self._build_default_config()
+            config = self._default_config.model_copy()
         else:
-            config = kwargs['config']
-            kwargs = kwargs.copy()
-            kwargs.pop('config')
+            # 配置thinking_config
+            if not hasattr(config, 'thinking_config') or config.thinking_config is None:
+                config.thinking_config = genai.types.ThinkingConfig(
+                    include_thoughts=True,
+                    thinking_budget=self.thinking_budget
+                )
 
-        # 配置thinking_config
-        if not hasattr(config, 'thinking_config') or config.thinking_config is None:
-            config.thinking_config = genai.types.ThinkingConfig(
-                include_thoughts=True,
-                thinking_budget=self.thinking_budget
-            )
+            # 确保thinking_budget已设置
+            if not config.thinking_config.thinking_budget:
+                config.thinking_config.thinking_budget = self.thinking_budget
 
         # 设置系统指令
         if system_instruction:
             config.system_instruction = system_instruction
 
-        # 确保thinking_budget已设置
-        if not config.thinking_config.thinking_budget:
-            config.thinking_config.thinking_budget = self.thinking_budget
-
         return generate_func(model=model, contents=messages, config=config)
 
 
@@ -12,32 +12,20 @@ OpenAI聊天机器人实现模块
 - 自动处理系统指令
 """
 
+import httpx
 import openai
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from typing import Iterator, AsyncIterator, Optional, Callable, Union, Coroutine, List, Dict, Any
 
 from . import StreamUtils
+from .StreamUtils.common_utils import json_loads, json_dumps
 from .Client import *
+from .Client import _acquire_httpx_client, _release_client
 from ._BaseChatBot import *
 
 __all__ = ['OpenAISDKChatBot', 'OpenAIHttpxChatBot']
 
 
-def _chatcompletion_message_has_reasoning(message):
-    """
-    检查消息是否包含推理内容
-
-    DeepSeek等模型提供thinking/reasoning功能，通过reasoning_content属性暴露。
-
-    参数:
-        message: ChatCompletion中的message对象
-
-    返回:
-        bool: 是否包含推理内容
-    """
-    return hasattr(message, 'reasoning_content') and message.reasoning_content
-
-
 def _handle_complete_chatcompletion(
     chatbot,
     inputs: ChatCompletion,
@@ -61,23 +49,30 @@ def _handle_complete_chatcompletion(
         2. 如果启用realtime_display，打印第一个choice的内容
         3. 根据show_thinking配置决定是否显示推理内容
     """
+    # reasoning_content 是DeepSeek等提供商的扩展字段，标准message上可能不存在
     if callback:
         for choice in inputs.choices:
+            message = choice.message
             # 处理推理内容（如DeepSeek的思考过程）
-            if _chatcompletion_message_has_reasoning(choice.message):
-                callback(choice.message.reasoning_content, True, choice.index)
+            reasoning_content = getattr(message, 'reasoning_content', None)
+            if reasoning_content:
+                callback(reasoning_content, True, choice.index)
             # 处理普通内容
-            if choice.message.content:
-                callback(choice.message.content, False, choice.index)
+            content = message.content
+            if content:
+                callback(content, False, choice.index)
 
     if chatbot.realtime_display and inputs.choices:
         message = inputs.choices[0].message
         # 显示推理内容
-        if chatbot.show_thinking and _chatcompletion_message_has_reasoning(message):
-            print(message.reasoning_content, flush=True)
+        if chatbot.show_thinking:
+            reasoning_content = getattr(message, 'reasoning_content', None)
+            if reasoning_content:
+                print(reasoning_content, flush=True)
         # 显示普通内容
-        if message.content:
-            print(message.content, flush=True)
+        content = message.content
+        if content:
+            print(content, flush=True)
 
     return inputs
 
@@ -99,25 +94,23 @@ def _insert_openai_system_instruction(system_instruction: str, messages: List[Di
     注意:
         返回新列表，不修改原列表
     """
-    messages = messages.copy()
-    message = messages[0]
-    # 如果已有系统消息，先移除
-    if message['role'] == 'system':
-        messages.pop(0)
-    # 插入新的系统指令
-    messages.insert(0, {'role': 'system', 'content': system_instruction})
-    return messages
+    system_message = {'role': 'system', 'content': system_instruction}
+    # 如果已有系统消息，替换之；一次构建新列表，避免copy后再pop(0)/insert(0)移动整个列表
+    if messages and messages[0]['role'] == 'system':
+        return [system_message, *messages[1:]]
+    return [system_message, *messages]
 
 
-def _chatcompletion_to_unified_format(response: ChatCompletion) -> Dict[str, Any]:
+def _chatcompletion_to_unified_format(response: ChatCompletion, include_raw: bool = True) -> ResponseDict:
     """
     将 ChatCompletion 转换为统一格式
 
     参数:
         response: OpenAI ChatCompletion 对象
+        include_raw: 是否生成 _raw_dict，默认True
 
     返回:
-        统一格式字典，参考 BaseChatBot._to_unified_format 文档
+        统一格式的ResponseDict，参考 BaseChatBot._to_unified_format 文档
     """
     if not response.choices:
         return _create_empty_unified_response(role='assistant', model=response.model)
@@ -126,16 +119,17 @@ def _chatcompletion_to_unified_format(response: ChatCompletion) -> Dict[str, Any
     message = choice.message
 
     # 提取核心内容
-    result = {
+    result = ResponseDict({
         'role': 'assistant',
         'content': message.content or '',
         '_model': response.model,
         '_finish_reason': choice.finish_reason or 'unknown'
-    }
+    })
 
     # 添加推理内容（如果有）
-    if _chatcompletion_message_has_reasoning(message):
-        result['_thinking'] = message.reasoning_content
+    reasoning_content = getattr(message, 'reasoning_content', None)
+    if reasoning_content:
+        result['_thinking'] = reasoning_content
 
     # 添加 usage 信息
     if response.usage:
@@ -147,8 +141,9 @@ def _chatcompletion_to_unified_format(response: ChatCompletion) -> Dict[str, Any
     else:
         result['_usage'] = {}
 
-    # 添加完整原始数据
-    result['_raw_dict'] = response.model_dump(exclude_none=True)
+    # 添加完整原始数据（include_raw=False 时省去 model_dump 的完整遍历）
+    if include_raw:
+        result['_raw_dict'] = response.model_dump(exclude_none=True)
 
     return result
 
@@ -180,6 +175,8 @@ class OpenAISDKChatBot(BaseSDKChatBot):
         ... )
     """
 
+    __slots__ = ()
+
     @property
     def interfacetype(self):
         return 'openai'
@@ -188,9 +185,9 @@ class OpenAISDKChatBot(BaseSDKChatBot):
         """创建OpenAI流式累加器"""
         return StreamUtils.OpenAI.StreamAccumulator()
 
-    def _to_unified_format(self, raw_response: ChatCompletion) -> Dict[str, Any]:
+    def _to_unified_format(self, raw_response: ChatCompletion, include_raw: bool = True) -> ResponseDict:
         """将 ChatCompletion 转换为统一格式"""
-        return _chatcompletion_to_unified_format(raw_response)
+        return _chatcompletion_to_unified_format(raw_response, include_raw)
 
     def _handle_complete_response(
         self,
@@ -305,6 +302,8 @@ class OpenAIHttpxChatBot(BaseChatBot):
         ... )
     """
 
+    __slots__ = ('client', '_lease', 'api_key', 'base_url', 'url', 'headers')
+
     def __init__(
         self,
         api_key: str,
@@ -312,7 +311,8 @@ class OpenAIHttpxChatBot(BaseChatBot):
         is_async: bool,
         is_ssl_verify: bool = False,
         realtime_display: bool = True,
-        show_thinking: bool = True
+        show_thinking: bool = True,
+        http2: bool = True
     ):
         """
         初始化Httpx聊天机器人
@@ -324,6 +324,8 @@ class OpenAIHttpxChatBot(BaseChatBot):
             is_ssl_verify: 是否验证SSL证书，默认False
             realtime_display: 是否实时显示输出，默认True
             show_thinking: 是否显示推理内容，默认True
+            http2: 是否启用HTTP/2，默认True（需安装h2，未安装时自动使用HTTP/1.1）
+                   代理或服务端只支持HTTP/1.1时可设为False
 
         异常:
             ValueError: 如果 API key 为空或无效
@@ -337,14 +339,16 @@ class OpenAIHttpxChatBot(BaseChatBot):
                 "Please check your .env file or pass api_key explicitly."
             )
 
-        self.client = HttpxClient(is_async, is_ssl_verify, timeout=300)
+        self._lease = _acquire_httpx_client(is_async, is_ssl_verify, timeout=300, http2=http2)
+        self.client = self._lease[0]
         self.api_key = api_key
         self.base_url = base_url.rstrip('/')
         self.url = f'{self.base_url}/chat/completions'
-        self.headers = {
+        # 预先构建httpx.Headers，httpx合并请求头时直接复制已编码的列表，无需每次重新规范化
+        self.headers = httpx.Headers({
             'Authorization': f'Bearer {api_key}',
             'Content-type': 'application/json'
-        }
+        })
 
     async def aclose(self):
         """
@@ -352,11 +356,13 @@ class OpenAIHttpxChatBot(BaseChatBot):
 
         Httpx特殊实现：httpx使用aclose()而非close()
         """
-        await self.client.aclose()
+        lease, self._lease = self._lease, None
+        if _release_client(lease):
+            await self.client.aclose()
 
-    def _to_unified_format(self, raw_response: ChatCompletion) -> Dict[str, Any]:
+    def _to_unified_format(self, raw_response: ChatCompletion, include_raw: bool = True) -> ResponseDict:
         """将 ChatCompletion 转换为统一格式"""
-        return _chatcompletion_to_unified_format(raw_response)
+        return _chatcompletion_to_unified_format(raw_response, include_raw)
 
     def send_request(
         self,
@@ -390,11 +396,12 @@ class OpenAIHttpxChatBot(BaseChatBot):
         if stream:
             data['stream_options'] = {'include_usage': True}
 
-        # 发送请求
+        # 发送请求（请求体预先序列化为bytes，有orjson时比httpx内部的json.dumps更快）
+        content = json_dumps(data)
         if stream:
-            response = self.client.stream('POST', self.url, headers=self.headers, json=data)
+            response = self.client.stream('POST', self.url, headers=self.headers, content=content)
         else:
-            response = self.client.post(self.url, headers=self.headers, json=data)
+            response = self.client.post(self.url, headers=self.headers, content=content)
 
         return stream, response
 
@@ -420,20 +427,20 @@ class OpenAIHttpxChatBot(BaseChatBot):
                 response.raise_for_status()
                 # 将httpx流式响应转换为OpenAI格式
                 response = StreamUtils.Httpx2OpenAI.ProcessStreamResponse(
-                    response.iter_lines(),
+                    response.iter_bytes(),
                     callback,
                     self.realtime_display,
                     self.show_thinking
                 )
                 if self.realtime_display:
-                    print('\n')  # 流式输出完成后换行
+                    print(end='\n\n', flush=True)  # 流式输出完成后换行（单次写入并刷新）
                 return response
         else:
             # 完整响应处理
             response = inputs[1]
             response.raise_for_status()
             # 将JSON响应解析为OpenAI ChatCompletion格式
-            response = StreamUtils.Httpx2OpenAI.ParseTotalResponse(response.json())
+            response = StreamUtils.Httpx2OpenAI.ParseTotalResponse(json_loads(response.content))
             return _handle_complete_chatcompletion(self, response, callback)
 
     async def _handle_async(self, inputs, callback: Optional[Callable[[str, bool, int], None]] = None):
@@ -456,13 +463,13 @@ class OpenAIHttpxChatBot(BaseChatBot):
                 response.raise_for_status()
                 # 将httpx异步流式响应转换为OpenAI格式
                 response = await StreamUtils.Httpx2OpenAI.AsyncProcessStreamResponse(
-                    response.aiter_lines(),
+                    response.aiter_bytes(),
                     callback,
                     self.realtime_display,
                     self.show_thinking
                 )
                 if self.realtime_display:
-                    print('\n')  # 流式输出完成后换行
+                    print(end='\n\n', flush=True)  # 流式输出完成后换行（单次写入并刷新）
                 return response
         else:
             # 异步完整响应处理（等待响应后复用同步逻辑）
@@ -26,6 +26,14 @@ from ._Anthropic import *
 
 __all__ = ['ChatBotFunc', 'ResponseDict']
 
+# (interfacetype, use_sdk) -> 聊天机器人类
+_CHATBOT_CLASSES = {
+    ('openai', True): OpenAISDKChatBot,
+    ('google', True): GoogleSDKChatBot,
+    ('anthropic', True): AnthropicSDKChatBot,
+    ('openai', False): OpenAIHttpxChatBot,
+}
+
 
 def ChatBotFunc(interfacetype: str, use_sdk: bool = True):
     """
@@ -54,12 +62,8 @@ def ChatBotFunc(interfacetype: str, use_sdk: bool = True):
         >>> chatbot_class = ChatBotFunc(interfacetype='openai', use_sdk=False)
         >>> chatbot = chatbot_class(api_key='xxx', base_url='https://api.example.com/v1')
     """
-    if use_sdk and interfacetype == 'openai':
-        return OpenAISDKChatBot
-    elif use_sdk and interfacetype == 'google':
-        return GoogleSDKChatBot
-    elif use_sdk and interfacetype == 'anthropic':
-        return AnthropicSDKChatBot
-    else:
+    chatbot_class = _CHATBOT_CLASSES.get((interfacetype, bool(use_sdk)))
+    if chatbot_class is None:
         assert interfacetype == 'openai', "Httpx ChatBot 仅支持 openai interface"
         return OpenAIHttpxChatBot
+    return chatbot_class
@@ -36,8 +36,10 @@ ApiChatBot 配置模块
 """
 
 import os
+import functools
+from types import MappingProxyType
 from typing import Dict, Optional
-from dotenv import load_dotenv
+from dotenv import dotenv_values, find_dotenv
 
 __all__ = [
     'COMPANIES',
@@ -51,11 +53,11 @@ __all__ = [
 ]
 
 # ============================================================
-# 配置模板（常量）
+# 配置模板（常量，使用 tuple / MappingProxyType 防止被意外修改）
 # ============================================================
 
 # 支持的LLM提供商列表
-COMPANIES = [
+COMPANIES = (
     'openai',
     'google',
     'anthropic',
@@ -63,10 +65,10 @@ COMPANIES = [
     'aliyun',
     'deepseek',
     'openrouter'
-]
+)
 
 # 提供商接口类型映射
-INTERFACETYPE = {
+INTERFACETYPE = MappingProxyType({
     'openai': 'openai',
     'google': 'google',
     'anthropic': 'anthropic',
@@ -74,43 +76,43 @@ INTERFACETYPE = {
     'aliyun': 'openai',         # 使用OpenAI兼容接口
     'deepseek': 'openai',       # 使用OpenAI兼容接口
     'openrouter': 'openai',     # 使用OpenAI兼容接口
-}
+})
 
 # 各提供商的建议模型列表（用于测试）
 # 注意：这不是全部可用模型，实际使用时可以指定任意该提供商支持的模型
-MODELS = {
-    'openai': [
+MODELS = MappingProxyType({
+    'openai': (
         'gpt-4o',
         # 'gemini-2.5-flash',
-        # 'claude-sonnet-4-20250514'
-    ],
-    'google': [
+        # 'claude-sonnet-4-20250514',
+    ),
+    'google': (
         'gemini-2.5-flash',
         # 'gemini-2.5-pro'
-    ],
-    'anthropic': [
-        'claude-sonnet-4-20250514'
-    ],
-    'moonshot': [
+    ),
+    'anthropic': (
+        'claude-sonnet-4-20250514',
+    ),
+    'moonshot': (
         'kimi-k2-0711-preview',
         # 'kimi-k2-turbo-preview'
-    ],
-    'aliyun': [
-        'qwen-plus'
-    ],
-    'deepseek': [
+    ),
+    'aliyun': (
+        'qwen-plus',
+    ),
+    'deepseek': (
         # 'deepseek-reasoner',
-        'deepseek-chat'
-    ],
-    'openrouter': [
+        'deepseek-chat',
+    ),
+    'openrouter': (
         'openai/gpt-4o',
         # 'google/gemini-2.5-flash',
         # 'anthropic/claude-sonnet-4'
-    ],
-}
+    ),
+})
 
 # 默认 API 基础 URL
-DEFAULT_BASE_URLS = {
+DEFAULT_BASE_URLS = MappingProxyType({
     'openai': 'https://api.openai.com/v1',
     'google': 'https://generativelanguage.googleapis.com',
     'anthropic': 'https://api.anthropic.com/v1/messages',
@@ -118,7 +120,7 @@ DEFAULT_BASE_URLS = {
     'aliyun': 'https://dashscope.aliyuncs.com/compatible-mode/v1',
     'deepseek': 'https://api.deepseek.com',
     'openrouter': 'https://openrouter.ai/api/v1',
-}
+})
 
 # 环境变量名映射
 _ENV_VAR_KEYS = {
@@ -145,6 +147,36 @@ _ENV_VAR_BASE_URLS = {
 # 配置加载函数（按需使用）
 # ============================================================
 
+@functools.lru_cache(maxsize=8)
+def _dotenv_values_cached(dotenv_path: str, mtime: Optional[float]) -> Dict[str, Optional[str]]:
+    """读取并解析 .env 文件；以文件修改时间为缓存键，文件未变化时不重复读取解析"""
+    return dotenv_values(dotenv_path)
+
+
+def _load_env(env_file: Optional[str] = None) -> None:
+    """
+    加载 .env 文件到环境变量（同一文件未修改时只解析一次）
+
+    只缓存解析结果，每次调用都重新写入环境变量，
+    因此交替使用多个 env_file、或加载后又修改了 os.environ 时，行为与直接调用 load_dotenv 一致。
+
+    Args:
+        env_file: .env 文件路径（可选，指定时覆盖已有环境变量）
+                 None 表示自动向上查找 .env 文件（不覆盖已有环境变量）
+    """
+    dotenv_path = env_file or find_dotenv()
+    if not dotenv_path:
+        return
+    try:
+        mtime = os.path.getmtime(dotenv_path)
+    except OSError:
+        return
+    override = bool(env_file)
+    for key, value in _dotenv_values_cached(dotenv_path, mtime).items():
+        if value is not None and (override or key not in os.environ):
+            os.environ[key] = value
+
+
 def load_config_from_env(env_file: Optional[str] = None) -> Dict:
     """
     从环境变量或 .env 文件加载配置
@@ -156,10 +188,7 @@ def load_config_from_env(env_file: Optional[str] = None) -> Dict:
     Returns:
         配置字典，包含 API_KEYS 和 BASE_URLS
     """
-    if env_file:
-        load_dotenv(dotenv_path=env_file, override=True)
-    else:
-        load_dotenv()  # 自动向上查找 .env
+    _load_env(env_file)
 
     api_keys = {
         company: os.getenv(_ENV_VAR_KEYS[company], '')
@@ -200,10 +229,7 @@ def get_api_key(company: str, env_file: Optional[str] = None) -> str:
     Returns:
         API 密钥字符串
     """
-    if env_file:
-        load_dotenv(dotenv_path=env_file, override=True)
-    else:
-        load_dotenv()
+    _load_env(env_file)
 
     return os.getenv(_ENV_VAR_KEYS.get(company, ''), '')
 
@@ -219,10 +245,7 @@ def get_base_url(company: str, env_file: Optional[str] = None) -> str:
     Returns:
         Base URL 字符串
     """
-    if env_file:
-        load_dotenv(dotenv_path=env_file, override=True)
-    else:
-        load_dotenv()
+    _load_env(env_file)
 
     return os.getenv(
         _ENV_VAR_BASE_URLS.get(company, ''),
@@ -24,14 +24,11 @@ class ResponseDict(dict):
 
     def __repr__(self) -> str:
         """只显示 role 和 content 字段"""
-        return str({
-            'role': self.get('role', 'unknown'),
-            'content': self.get('content', '')
-        })
-
-    def __str__(self) -> str:
-        """字符串表示，与repr相同"""
-        return self.__repr__()
+        get = dict.get
+        return f"{{'role': {get(self, 'role', 'unknown')!r}, 'content': {get(self, 'content', '')!r}}}"
+
+    # 字符串表示，与repr相同
+    __str__ = __repr__
 
     def full_repr(self) -> str:
         """返回完整的字典表示（包括所有字段）"""
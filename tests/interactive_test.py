@@ -1,7 +1,10 @@
 #%%
-# 启用运行时类型检查
-from typeguard import install_import_hook
-install_import_hook('ApiChatBot')
+# 启用运行时类型检查（默认开启；设置环境变量 APICHATBOT_TYPECHECK=0 可关闭，
+# 用于测量流式性能时去掉每次调用的类型检查开销）
+import os
+if os.environ.get('APICHATBOT_TYPECHECK', '1') != '0':
+    from typeguard import install_import_hook
+    install_import_hook('ApiChatBot')
 
 import sys
 from pathlib import Path
@@ -35,6 +38,9 @@ base_url = BASE_URLS[company]
 api_key = API_KEYS[company]
 interfacetype = INTERFACETYPE[company]
 
+# 标题块分隔线
+SEP_EQ = '=' * 60
+
 # 创建聊天机器人实例
 chatbotfunc = ApiChatBot.ChatBotFunc(interfacetype, use_sdk)
 chatbot = chatbotfunc(
@@ -52,10 +58,7 @@ async def main():
     responses = []
 
     for turn, user_message in enumerate(conversation, 1):
-        print(f"\n{'='*60}")
-        print(f"第 {turn} 轮对话")
-        print(f"{'='*60}")
-        print(f"用户: {user_message}\n")
+        print(f"\n{SEP_EQ}\n第 {turn} 轮对话\n{SEP_EQ}\n用户: {user_message}\n")
 
         # 添加用户消息
         messages.append({'role': 'user', 'content': user_message})
@@ -75,9 +78,7 @@ async def main():
         responses.append(response)
         messages.append(response)
 
-    print(f"\n{'='*60}")
-    print(f"✓ 多轮对话测试完成 (共 {turn} 轮)")
-    print(f"{'='*60}\n")
+    print(f"\n{SEP_EQ}\n✓ 多轮对话测试完成 (共 {turn} 轮)\n{SEP_EQ}\n")
 
     # 清理资源
     if is_async:
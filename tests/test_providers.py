@@ -12,9 +12,12 @@ ApiChatBot 综合测试脚本
 """
 
 #%%
-# 启用运行时类型检查
-from typeguard import install_import_hook
-install_import_hook('ApiChatBot')
+# 启用运行时类型检查（默认开启；设置环境变量 APICHATBOT_TYPECHECK=0 可关闭，
+# 用于测量流式性能时去掉每次调用的类型检查开销）
+import os
+if os.environ.get('APICHATBOT_TYPECHECK', '1') != '0':
+    from typeguard import install_import_hook
+    install_import_hook('ApiChatBot')
 
 import sys
 from pathlib import Path
@@ -22,23 +25,28 @@ from pathlib import Path
 # 添加父目录到路径，以便导入 ApiChatBot
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-import httpx
 import asyncio
-import random
-import openai
-import google
-import anthropic
-from typing import Optional, Union, List, Dict, Any
-from openai import OpenAI, AsyncOpenAI
-from openai.types.chat import ChatCompletion
-from google import genai
-from google.genai.types import GenerateContentResponse
-from anthropic import Anthropic, AsyncAnthropic
-from anthropic.types import Message
+import itertools
+from typing import Optional, List, Dict, Any
 from _config import *
 import ApiChatBot
 
 #%%
+# 通过OpenAI接口访问Gemini时的额外请求参数（模块级常量，所有轮次与配置共享，只读）
+_GEMINI_OPENAI_KWARGS = {
+    'extra_body': {
+        'extra_body': {
+            'google': {
+                'thinking_config': {
+                    'thinking_budget': -1,
+                    'include_thoughts': True
+                }
+            }
+        }
+    }
+}
+_EMPTY_KWARGS = {}
+
 # TODO: 待扩展功能 - Tool calls, JSON输出
 # 多轮对话默认配置
 DEFAULT_CONVERSATION = [
@@ -57,9 +65,25 @@ def is_api_key_available(company: str) -> bool:
     return bool(api_key and api_key.strip())
 
 
+# 接口类型 -> 公司列表（按 INTERFACETYPE 顺序，导入时构建一次）
+INTERFACETYPE_INDEX: Dict[str, List[str]] = {}
+for _company, _itype in INTERFACETYPE.items():
+    INTERFACETYPE_INDEX.setdefault(_itype, []).append(_company)
+
+
 def get_companies_by_interfacetype(interfacetype: str) -> List[str]:
     """根据接口类型获取对应的公司列表"""
-    return [company for company, itype in INTERFACETYPE.items() if itype == interfacetype]
+    return list(INTERFACETYPE_INDEX.get(interfacetype, ()))
+
+
+# 标题块分隔线
+SEP_EQ = '=' * 60
+SEP_HASH = '#' * 60
+
+
+def _print_banner(bar: str, *lines: str) -> None:
+    """一次性输出带分隔线的标题块（合并为单次print，减少零碎的stdout写入）"""
+    print('\n'.join(('', bar, *lines, bar, '')))
 
 
 def test_conversation(
@@ -128,25 +152,12 @@ async def _async_conversation(
 
     # 处理特殊配置（如通过OpenAI接口访问Gemini时的thinking_config）
     if isinstance(chatbot, ApiChatBot.BaseSDKChatBot) and chatbot.interfacetype == 'openai' and model.startswith('gemini'):
-        extra_body = {
-            'extra_body': {
-                'google': {
-                    'thinking_config': {
-                        'thinking_budget': -1,
-                        'include_thoughts': True
-                    }
-                }
-            }
-        }
-        kwargs = {'extra_body': extra_body}
+        kwargs = _GEMINI_OPENAI_KWARGS
     else:
-        kwargs = {}
+        kwargs = _EMPTY_KWARGS
 
     for turn, user_message in enumerate(conversation, 1):
-        print(f"\n{'='*60}")
-        print(f"第 {turn} 轮对话")
-        print(f"{'='*60}")
-        print(f"用户: {user_message}\n")
+        print(f"\n{SEP_EQ}\n第 {turn} 轮对话\n{SEP_EQ}\n用户: {user_message}\n")
 
         # 添加用户消息
         messages.append({'role': 'user', 'content': user_message})
@@ -170,9 +181,7 @@ async def _async_conversation(
         responses.append(response)
         messages.append(response)
 
-    print(f"\n{'='*60}")
-    print(f"✓ 多轮对话测试完成 (共 {turn} 轮)")
-    print(f"{'='*60}\n")
+    _print_banner(SEP_EQ, f"✓ 多轮对话测试完成 (共 {turn} 轮)")
 
     # 清理资源
     if is_async:
@@ -209,18 +218,14 @@ def test_company(
     """
     # 检查 API key
     if not is_api_key_available(company):
-        print(f"\n{'='*60}")
-        print(f"⚠️  跳过 {company}: 未配置 API Key")
-        print(f"{'='*60}\n")
+        _print_banner(SEP_EQ, f"⚠️  跳过 {company}: 未配置 API Key")
         return 0
 
     # 使用默认对话或自定义对话
     if conversation is None:
         conversation = DEFAULT_CONVERSATION
 
-    print(f"\n{'='*60}")
-    print(f"开始测试 {company.upper()}")
-    print(f"{'='*60}\n")
+    _print_banner(SEP_EQ, f"开始测试 {company.upper()}")
 
     interfacetype = INTERFACETYPE[company]
 
@@ -264,23 +269,18 @@ def test_company(
     else:  # response == 'both'
         is_streamed_options = [True, False]
 
-    # 执行所有组合的测试
-    test_count = 0
-    for use_sdk in use_sdk_options:
-        for test_model in model_options:
-            for is_async in is_async_options:
-                for is_streamed in is_streamed_options:
-                    test_count += 1
-                    print(f"\n--- Test {test_count} ---")
-                    responses = test_conversation(
-                        company, test_model, is_async, is_streamed,
-                        is_ssl_verify, use_sdk, conversation, system_instruction
-                    )
-                    print("✓ 测试成功\n")
-
-    print(f"\n{'='*60}")
-    print(f"{company.upper()} 测试完成 (共 {test_count} 个配置)")
-    print(f"{'='*60}\n")
+    # 执行所有组合的测试（use_sdk_options 已排除非OpenAI接口的Httpx模式）
+    configs = list(itertools.product(use_sdk_options, model_options, is_async_options, is_streamed_options))
+    for test_count, (use_sdk, test_model, is_async, is_streamed) in enumerate(configs, 1):
+        print(f"\n--- Test {test_count}/{len(configs)} ---")
+        responses = test_conversation(
+            company, test_model, is_async, is_streamed,
+            is_ssl_verify, use_sdk, conversation, system_instruction
+        )
+        print("✓ 测试成功\n")
+    test_count = len(configs)
+
+    _print_banner(SEP_EQ, f"{company.upper()} 测试完成 (共 {test_count} 个配置)")
 
     return test_count
 
@@ -303,10 +303,7 @@ def test_interfacetype(
     """
     companies = get_companies_by_interfacetype(interfacetype)
 
-    print(f"\n{'#'*60}")
-    print(f"开始测试接口类型: {interfacetype.upper()}")
-    print(f"包含公司: {', '.join(companies)}")
-    print(f"{'#'*60}\n")
+    _print_banner(SEP_HASH, f"开始测试接口类型: {interfacetype.upper()}", f"包含公司: {', '.join(companies)}")
 
     total_count = 0
     for company in companies:
@@ -314,9 +311,7 @@ def test_interfacetype(
                            conversation, system_instruction)
         total_count += count
 
-    print(f"\n{'#'*60}")
-    print(f"接口类型 {interfacetype.upper()} 测试完成 (共 {total_count} 个配置)")
-    print(f"{'#'*60}\n")
+    _print_banner(SEP_HASH, f"接口类型 {interfacetype.upper()} 测试完成 (共 {total_count} 个配置)")
 
     return total_count
 
@@ -336,16 +331,11 @@ def test_all(
     Returns:
       int: 完成的测试配置总数
     """
-    print(f"\n{'#'*60}")
-    print(f"开始测试所有提供商")
-    print(f"{'#'*60}\n")
+    _print_banner(SEP_HASH, "开始测试所有提供商")
 
     # 先显示配置状态
-    print("配置检查:")
-    for company in COMPANIES:
-        status = '✓' if is_api_key_available(company) else '✗'
-        print(f"  {status} {company}")
-    print()
+    status_lines = [f"  {'✓' if is_api_key_available(company) else '✗'} {company}" for company in COMPANIES]
+    print('\n'.join(("配置检查:", *status_lines, '')))
 
     # 按 interfacetype 分组测试
     total_count = 0
@@ -354,9 +344,7 @@ def test_all(
                                   conversation, system_instruction)
         total_count += count
 
-    print(f"\n{'#'*60}")
-    print(f"所有测试完成 (共 {total_count} 个配置)")
-    print(f"{'#'*60}\n")
+    _print_banner(SEP_HASH, f"所有测试完成 (共 {total_count} 个配置)")
 
     return total_count
 
@@ -369,7 +357,7 @@ if __name__ == '__main__':
     import argparse
 
     # 动态生成支持的接口类型列表
-    supported_interfacetypes = sorted(set(INTERFACETYPE.values()))
+    supported_interfacetypes = sorted(INTERFACETYPE_INDEX)
 
     # 构建建议模型列表显示
     models_display = "\n建议模型列表（若使用 --model 则可指定非建议模型）:\n"